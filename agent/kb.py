@@ -1,16 +1,16 @@
 import redis
 
-rd = redis.Redis(host='localhost', port=6379, decode_responses=True)
-
 recruitment_steps = {
-    "1": {"text": "Hi, may I speak with {{consumer_name}}?", "next": "2"},
-    "2": {"text": "This is {{recruiter_role}} from Greet Technologies. I found your profile on Naukri—are you currently exploring job opportunities?", "next": "3"},
-    "3": {"text": "We're hiring for an Accounts Process Executive role. Would you like to know more?", "next": "4"},
-    "4": {"text": "We are located in HSR Layout. Would it be convenient for you to commute to this location for work?", "next": "5"},
+    "1": {"text": "Hi, may I speak with {{consumer_name}}?", "next": "2", "turn": "yes_no", "fact": "Right person"},
+    "2": {"text": "This is {{recruiter_role}} from Greet Technologies. I found your profile on Naukri—are you currently exploring job opportunities?", "next": "3", "turn": "yes_no", "fact": "Exploring jobs"},
+    "3": {"text": "We're hiring for an Accounts Process Executive role. Would you like to know more?", "next": "4", "turn": "yes_no", "fact": "Wants role details"},
+    "4": {"text": "We are located in HSR Layout. Would it be convenient for you to commute to this location for work?", "next": "5", "turn": "yes_no", "fact": "Commute to HSR Layout OK"},
     "5": {
         "text": "What are all languages you can speak?", 
         "next": "6",
-        "logic": "check_hindi" # Special flag for your Agent code
+        "logic": "check_hindi", # Special flag for your Agent code
+        "turn": "short",
+        "fact": "Languages"
     },
     "hindi_fail": {
         "text": "I understand. Hindi is a mandatory requirement for this position. Unfortunately, we cannot proceed, but we will keep your profile in our database. Goodbye.",
@@ -19,24 +19,44 @@ recruitment_steps = {
     "6": {
         "text": "Could you tell me a bit about yourself in Hindi and English?", 
         "next": "7",
-        "logic": "evaluate_language" # Trigger for scoring 6/10 Hindi, 7/10 English
+        "logic": "evaluate_language", # Trigger for scoring 6/10 Hindi, 7/10 English
+        "turn": "open",
+        "fact": "Self-introduction"
     },
     "eval_fail": {
         "text": "Thank you for your introduction. Unfortunately, your proficiency levels do not meet the minimum requirement for this role. We appreciate your time. Goodbye.",
         "next": "end"
     },
-    "7": {"text": "This role involves working on Tally software. You'd be helping CA and CS clients with their accounting queries. How does that sound?", "next": "8"},
-    "8": {"text": "There are no sales targets or agreements—it's a stable KPO process. Are you comfortable with this kind of work?", "next": "9"},
-    "9": {"text": "Since this is a specialized role, there's a thirty to thirty-five day training covering Tally, TDS, and GST—with certification. Does that work for you?", "next": "10"},
-    "10": {"text": "During training, you'll receive a stipend of ten thousand five hundred rupees. Is that okay?", "next": "11"},
-    "11": {"text": "After training, the CTC is twenty thousand two hundred rupees. Take-home would be around eighteen thousand six hundred without PF, or fifteen thousand with PF. Any questions on this?", "next": "12"},
-    "12": {"text": "Great! Would you be available for an interview tomorrow?", "next": "13"},
-    "13": {"text": "Could you share your updated resume on this WhatsApp number?", "next": "14"},
-    "14": {"text": "Once your profile is shortlisted, I'll send you the interview location and details. Sound good?", "next": "end"}
+    "7": {"text": "This role involves working on Tally software. You'd be helping CA and CS clients with their accounting queries. How does that sound?", "next": "8", "turn": "short", "fact": "Tally/accounting work"},
+    "8": {"text": "There are no sales targets or agreements—it's a stable KPO process. Are you comfortable with this kind of work?", "next": "9", "turn": "yes_no", "fact": "Non-sales KPO work OK"},
+    "9": {"text": "Since this is a specialized role, there's a thirty to thirty-five day training covering Tally, TDS, and GST—with certification. Does that work for you?", "next": "10", "turn": "yes_no", "fact": "30-35 day training OK"},
+    "10": {"text": "During training, you'll receive a stipend of ten thousand five hundred rupees. Is that okay?", "next": "11", "turn": "yes_no", "fact": "Stipend 10,500 OK"},
+    "11": {"text": "After training, the CTC is twenty thousand two hundred rupees. Take-home would be around eighteen thousand six hundred without PF, or fifteen thousand with PF. Any questions on this?", "next": "12", "turn": "short", "fact": "Salary (CTC 20,200) questions"},
+    "12": {"text": "Great! Would you be available for an interview tomorrow?", "next": "13", "turn": "yes_no", "fact": "Interview tomorrow"},
+    "13": {"text": "Could you share your updated resume on this WhatsApp number?", "next": "14", "turn": "yes_no", "fact": "Will share resume"},
+    "14": {"text": "Once your profile is shortlisted, I'll send you the interview location and details. Sound good?", "next": "end", "turn": "yes_no", "fact": "Agreed to next steps"}
+}
+
+# Turn-taking per kind of answer ("turn" on each step):
+#   min/max_endpointing_delay - silence (s) before the agent replies
+#   stt_endpointing_ms        - Deepgram's own end-of-speech silence
+#   early_commit              - reply as soon as the transcript holds a complete answer
+turn_profiles = {
+    "yes_no": {"min_endpointing_delay": "0.2", "max_endpointing_delay": "1.5", "stt_endpointing_ms": "10", "early_commit": "1"},
+    "short": {"min_endpointing_delay": "0.5", "max_endpointing_delay": "3.0", "stt_endpointing_ms": "25", "early_commit": "1"},
+    # Step 6 self-introduction: people pause to think, don't cut them off
+    "open": {"min_endpointing_delay": "1.2", "max_endpointing_delay": "6.0", "stt_endpointing_ms": "300", "early_commit": "0"},
 }
 
-pipe = rd.pipeline()
-for step_id, data in recruitment_steps.items():
-    pipe.hset(f"step:{step_id}", mapping=data)
-pipe.execute()
-print("🚀 Full Kavya Recruitment Flow Loaded!")
\ No newline at end of file
+def load_steps(rd):
+    pipe = rd.pipeline()
+    for step_id, data in recruitment_steps.items():
+        pipe.hset(f"step:{step_id}", mapping=data)
+    for name, profile in turn_profiles.items():
+        pipe.hset(f"turn_profile:{name}", mapping=profile)
+    pipe.execute()
+
+if __name__ == "__main__":
+    rd = redis.Redis(host='localhost', port=6379, decode_responses=True)
+    load_steps(rd)
+    print("🚀 Full Kavya Recruitment Flow Loaded!")
\ No newline at end of file
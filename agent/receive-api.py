@@ -1,17 +1,21 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
+from typing import List
 import uvicorn
 import pymysql
+import logging
+import os
 from contextlib import contextmanager
 
 app = FastAPI()
+logger = logging.getLogger("receive-api")
 
 DB_CONFIG = {
-    "host": "192.168.1.63",
-    "port": 3306,
-    "user": "cron",
-    "password": "1234",
-    "db": "asterisk",
+    "host": os.getenv("VICI_DB_HOST", "192.168.1.63"),
+    "port": int(os.getenv("VICI_DB_PORT", "3306")),
+    "user": os.getenv("VICI_DB_USER", "cron"),
+    "password": os.getenv("VICI_DB_PASS", "1234"),
+    "db": os.getenv("VICI_DB_NAME", "asterisk"),
 }
 
 @contextmanager
@@ -29,6 +33,9 @@ class CallData(BaseModel):
     field_2: str 
     field_3: str 
 
+class ClearBatch(BaseModel):
+    unique_ids: List[str]
+
 @app.post("/receive-data")
 async def receive_data(data: CallData):
     try:
@@ -85,29 +92,51 @@ async def clear_data(unique_id: str):
 
 
 
+@app.post("/clear-data/batch")
+async def clear_data_batch(data: ClearBatch):
+    # Used by the post-call worker to clear many finished calls in one query
+    if not data.unique_ids:
+        return {"status": "deleted", "count": 0}
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                placeholders = ", ".join(["%s"] * len(data.unique_ids))
+                cursor.execute(f"DELETE FROM ai_call_data WHERE unique_id IN ({placeholders})", data.unique_ids)
+                conn.commit()
+                return {"status": "deleted", "count": cursor.rowcount}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+
 @app.post("/liveagents")
-async def getliveagents():
+async def getliveagents(limit: int = 1):
+    # limit > 1: the agent reserves the first free one (transfer.py), so two
+    # simultaneous transfers don't both get the same agent
     try:
         # 1. Added () to call the connection function
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
                 # 2. Fixed the SQL syntax (added ' after CLOSER and ) after the list)
+                # Longest-waiting agent first
                 query = """
                     SELECT user, conf_exten 
                     FROM vicidial_live_agents 
                     WHERE status IN ('READY', 'CLOSER') 
                     AND user != '1111' 
-                    LIMIT 1
+                    ORDER BY last_state_change
+                    LIMIT %s
                 """
-                cursor.execute(query)
-                row = cursor.fetchone()
+                cursor.execute(query, (max(1, min(limit, 20)),))
+                rows = cursor.fetchall()
                 
-                if not row:
-                    return {"user": None, "ext": "No agents available"}
+                if not rows:
+                    return {"user": None, "ext": "No agents available", "agents": []}
                 
                 return {
-                    "user": row['user'],
-                    "ext": row['conf_exten']
+                    "user": rows[0]['user'],
+                    "ext": rows[0]['conf_exten'],
+                    "agents": [{"user": row['user'], "ext": row['conf_exten']} for row in rows]
                 }
                 
     except Exception as e:
@@ -118,6 +147,6 @@ async def getliveagents():
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=9001)
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("RECEIVE_API_PORT", "9001")))
 
 
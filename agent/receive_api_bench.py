@@ -0,0 +1,267 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+
+import aiohttp
+import pymysql
+
+# Benchmark for receive-api.py against a local MySQL-compatible database.
+#
+#   docker compose --profile bench up -d bench-mysql
+#   python receive_api_bench.py --levels 1,10,50 --duration 10
+#   python receive_api_bench.py --compare bench_results/receive_api_<old>.json
+#
+# receive-api is started as a subprocess (its own process, like production),
+# pointed at the stand-in DB through the VICI_DB_* variables. The bench empties
+# its tables before every level, so it refuses to run against Vicidial's own
+# "asterisk" schema or any database with a vicidial_users table.
+
+BENCH_DB = {
+    "host": os.getenv("BENCH_DB_HOST", "127.0.0.1"),
+    "port": int(os.getenv("BENCH_DB_PORT", "3307")),
+    "user": os.getenv("BENCH_DB_USER", "root"),
+    "password": os.getenv("BENCH_DB_PASS", "bench"),
+    "db": os.getenv("BENCH_DB_NAME", "receive_api_bench"),
+}
+API_PORT = int(os.getenv("BENCH_API_PORT", "9011"))
+API_URL = f"http://127.0.0.1:{API_PORT}"
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results")
+
+# A p95 this much worse than the baseline is reported as a regression
+REGRESSION_FACTOR = 1.2
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS ai_call_data (
+        unique_id VARCHAR(50) PRIMARY KEY,
+        first_name VARCHAR(100),
+        field_2 VARCHAR(100),
+        field_3 VARCHAR(100)
+    )""",
+    """CREATE TABLE IF NOT EXISTS vicidial_live_agents (
+        user VARCHAR(20),
+        conf_exten VARCHAR(20),
+        status VARCHAR(20),
+        last_state_change DATETIME
+    )""",
+]
+
+# Weighted request mixes. "call_flow" replays the real call-setup path:
+# AGI push -> agent lookup -> cleanup, with the occasional transfer lookup.
+MIXES = {
+    "call_flow": None,
+    "read_heavy": {"get": 80, "receive": 10, "clear": 10},
+    "transfer_burst": {"liveagents": 100},
+}
+
+
+def check_bench_db(cur):
+    if BENCH_DB["db"] == "asterisk":
+        raise SystemExit('BENCH_DB_NAME is "asterisk" (Vicidial\'s schema); use a bench-only database')
+    cur.execute("SHOW TABLES LIKE 'vicidial_users'")
+    if cur.fetchone():
+        raise SystemExit(f"{BENCH_DB['db']} looks like a live Vicidial database (vicidial_users exists); use a bench-only database")
+
+
+def setup_db(seed_rows):
+    """Creates or upgrades the tables and resets the seed rows. Runs before every level: clear ops delete seed rows."""
+    conn = pymysql.connect(**{k: v for k, v in BENCH_DB.items() if k != "db"}, autocommit=True)
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE DATABASE IF NOT EXISTS {BENCH_DB['db']}")
+        cur.execute(f"USE {BENCH_DB['db']}")
+        check_bench_db(cur)
+        for stmt in SCHEMA:
+            cur.execute(stmt)
+        # A bench DB created before last_state_change was added
+        cur.execute("SELECT 1 FROM information_schema.columns WHERE table_schema = %s AND table_name = 'vicidial_live_agents'"
+                    " AND column_name = 'last_state_change'", (BENCH_DB["db"],))
+        if not cur.fetchone():
+            cur.execute("ALTER TABLE vicidial_live_agents ADD COLUMN last_state_change DATETIME")
+        cur.execute("DELETE FROM ai_call_data")
+        cur.execute("DELETE FROM vicidial_live_agents")
+        now = datetime.datetime.now().replace(microsecond=0)
+        cur.executemany(
+            "INSERT INTO vicidial_live_agents (user, conf_exten, status, last_state_change) VALUES (%s, %s, %s, %s)",
+            [(str(1000 + i), str(8600051 + i), random.choice(["READY", "CLOSER", "INCALL", "PAUSED"]),
+              now - datetime.timedelta(seconds=random.randrange(3600))) for i in range(50)],
+        )
+        cur.executemany(
+            "INSERT INTO ai_call_data (unique_id, first_name, field_2, field_3) VALUES (%s, %s, %s, %s)",
+            [(f"SEED{i:08d}", "Seed", f"lead_{i}", "active") for i in range(seed_rows)],
+        )
+    conn.close()
+
+
+def start_api():
+    env = dict(os.environ, RECEIVE_API_PORT=str(API_PORT), VICI_DB_HOST=BENCH_DB["host"],
+               VICI_DB_PORT=str(BENCH_DB["port"]), VICI_DB_USER=BENCH_DB["user"],
+               VICI_DB_PASS=BENCH_DB["password"], VICI_DB_NAME=BENCH_DB["db"])
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "receive-api.py")
+    return subprocess.Popen([sys.executable, script], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(session, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f"{API_URL}/get-data/ping") as resp:
+                if resp.status in (200, 404):
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("receive-api did not start")
+
+
+# --- Requests ---
+async def timed(session, stats, name, method, url, **kwargs):
+    start = time.perf_counter()
+    try:
+        async with session.request(method, url, **kwargs) as resp:
+            await resp.read()
+            ok = resp.status < 500
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        ok = False
+    stats.setdefault(name, {"lat": [], "errors": 0})
+    stats[name]["lat"].append((time.perf_counter() - start) * 1000)
+    if not ok:
+        stats[name]["errors"] += 1
+
+
+def new_uid():
+    return uuid.uuid4().hex[:20]
+
+
+async def do_receive(session, stats, uid):
+    payload = {"unique_id": uid, "field_1": "Bench", "field_2": "lead_1", "field_3": "active"}
+    await timed(session, stats, "receive", "POST", f"{API_URL}/receive-data", json=payload)
+
+
+async def do_get(session, stats, uid):
+    await timed(session, stats, "get", "GET", f"{API_URL}/get-data/{uid}")
+
+
+async def do_clear(session, stats, uid):
+    await timed(session, stats, "clear", "DELETE", f"{API_URL}/clear-data/{uid}")
+
+
+async def do_liveagents(session, stats, uid):
+    await timed(session, stats, "liveagents", "POST", f"{API_URL}/liveagents")
+
+
+OPS = {"receive": do_receive, "get": do_get, "clear": do_clear, "liveagents": do_liveagents}
+
+
+async def virtual_user(session, stats, mix, deadline, seed_rows):
+    while time.monotonic() < deadline:
+        if mix is None:
+            uid = new_uid()
+            await do_receive(session, stats, uid)
+            await do_get(session, stats, uid)
+            if random.random() < 0.05:
+                await do_liveagents(session, stats, uid)
+            await do_clear(session, stats, uid)
+        else:
+            op = random.choices(list(mix), weights=list(mix.values()))[0]
+            await OPS[op](session, stats, f"SEED{random.randrange(seed_rows):08d}")
+
+
+def summarize(stats, elapsed):
+    out = {}
+    for name, s in stats.items():
+        lat = sorted(s["lat"])
+        pick = lambda p: round(lat[min(int(len(lat) * p / 100), len(lat) - 1)], 2)
+        out[name] = {"requests": len(lat), "errors": s["errors"], "rps": round(len(lat) / elapsed, 1),
+                     "p50_ms": pick(50), "p95_ms": pick(95), "p99_ms": pick(99)}
+    return out
+
+
+async def run(args):
+    random.seed(args.seed)
+    setup_db(args.seed_rows)
+    proc = start_api()
+    results = []
+    try:
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10)) as session:
+            await wait_ready(session)
+            for mix_name in args.mixes:
+                for n in args.levels:
+                    # Same data and op sequence per (mix, level), whichever levels run before it
+                    random.seed(f"{args.seed}:{mix_name}:{n}")
+                    setup_db(args.seed_rows)
+                    stats = {}
+                    start = time.monotonic()
+                    deadline = start + args.duration
+                    await asyncio.gather(*(virtual_user(session, stats, MIXES[mix_name], deadline, args.seed_rows) for _ in range(n)))
+                    elapsed = time.monotonic() - start
+                    summary = summarize(stats, elapsed)
+                    results.append({"mix": mix_name, "concurrency": n, "elapsed_s": round(elapsed, 2), "endpoints": summary})
+                    for name, s in summary.items():
+                        print(f"{mix_name:<15} c={n:<4} {name:<11} rps={s['rps']:<8} p50={s['p50_ms']:<8} "
+                              f"p95={s['p95_ms']:<8} p99={s['p99_ms']:<8} err={s['errors']}")
+    finally:
+        proc.terminate()
+        proc.wait()
+    return results
+
+
+def git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path, seed):
+    with open(baseline_path) as f:
+        data = json.load(f)
+    if data.get("seed") != seed:
+        print(f"⚠️ Baseline ran with seed {data.get('seed')}, this run with {seed} - request mixes differ")
+    baseline = {(r["mix"], r["concurrency"]): r["endpoints"] for r in data["results"]}
+    regressions = 0
+    for r in current:
+        base = baseline.get((r["mix"], r["concurrency"]), {})
+        for name, s in r["endpoints"].items():
+            if name in base and s["p95_ms"] > base[name]["p95_ms"] * REGRESSION_FACTOR:
+                regressions += 1
+                print(f"⚠️ Regression {r['mix']} c={r['concurrency']} {name}: p95 {base[name]['p95_ms']} -> {s['p95_ms']} ms")
+    if not regressions:
+        print("✅ No p95 regressions against baseline")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="receive-api benchmark")
+    parser.add_argument("--levels", default="1,10,50", help="Comma separated concurrency levels")
+    parser.add_argument("--mixes", default=",".join(MIXES), help=f"Comma separated mixes: {', '.join(MIXES)}")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per mix/level")
+    parser.add_argument("--seed-rows", type=int, default=10000, help="Rows pre-loaded into ai_call_data")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for seed data and request mixes")
+    parser.add_argument("--out", help="Results file (default bench_results/receive_api_<time>.json)")
+    parser.add_argument("--compare", help="Baseline results file to check for regressions")
+    args = parser.parse_args()
+    args.levels = [int(x) for x in args.levels.split(",") if x]
+    args.mixes = [m for m in args.mixes.split(",") if m]
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(run(args))
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = args.out or os.path.join(RESULTS_DIR, f"receive_api_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out, "w") as f:
+        json.dump({"ts": time.time(), "git_rev": git_rev(), "duration_s": args.duration,
+                   "seed_rows": args.seed_rows, "seed": args.seed, "results": results}, f, indent=2)
+    print(f"Results written to {out}")
+
+    if args.compare and compare(results, args.compare, args.seed):
+        sys.exit(1)
@@ -0,0 +1,74 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger("livekit.agents")
+
+# --- Signed call-context payload (from greet-agi-load.php) ---
+# The AGI script puts the lead context into the X-VC-Context SIP header, which
+# the trunk maps to the "vici_ctx" participant attribute:
+#
+#   v1.<base64url(json)>.<base64url(hmac_sha256(secret, "v1.<base64url(json)>"))>
+#
+# json = {"v": 1, "fn": first name, "ph": phone, "lead_id", "unique_id", "ts": unix time}
+PAYLOAD_VERSION = "v1"
+PAYLOAD_ATTRIBUTE = "vici_ctx"
+PAYLOAD_SECRET = os.getenv("AI_PAYLOAD_SECRET", "")
+# Calls are answered within seconds of the AGI run; older payloads are replays
+PAYLOAD_MAX_AGE = int(os.getenv("AI_PAYLOAD_MAX_AGE", "300"))
+
+
+def _b64url_decode(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _b64url_encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def sign_payload(context, secret=PAYLOAD_SECRET, now=None):
+    body = dict(context, v=1, ts=int(now or time.time()))
+    signed = f"{PAYLOAD_VERSION}.{_b64url_encode(json.dumps(body, separators=(',', ':')).encode())}"
+    sig = hmac.new(secret.encode(), signed.encode(), hashlib.sha256).digest()
+    return f"{signed}.{_b64url_encode(sig)}"
+
+
+def decode_payload(token, secret=PAYLOAD_SECRET, max_age=PAYLOAD_MAX_AGE, now=None):
+    """Returns the verified context dict, or None if the payload is missing, tampered with or stale."""
+    if not token or not secret:
+        return None
+    try:
+        version, body, sig = token.split(".")
+        if version != PAYLOAD_VERSION:
+            logger.warning(f"Unsupported call payload version: {version}")
+            return None
+        expected = hmac.new(secret.encode(), f"{version}.{body}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64url_decode(sig)):
+            logger.warning("Call payload signature mismatch")
+            return None
+        context = json.loads(_b64url_decode(body))
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Malformed call payload: {e}")
+        return None
+
+    if abs((now or time.time()) - context.get("ts", 0)) > max_age:
+        logger.warning(f"Stale call payload for {context.get('unique_id')}")
+        return None
+    return context
+
+
+def context_from_participant(participant):
+    """Candidate context straight from the SIP participant, no receive-api/MySQL lookup."""
+    context = decode_payload(participant.attributes.get(PAYLOAD_ATTRIBUTE))
+    if not context:
+        return None
+    return {
+        "unique_id": context.get("unique_id"),
+        "lead_id": context.get("lead_id"),
+        "candidate_name": context.get("fn") or "Candidate",
+        "phone_no": context.get("ph") or "Unknown",
+    }
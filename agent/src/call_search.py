@@ -0,0 +1,164 @@
+import base64
+import datetime
+import re
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo.errors import ExecutionTimeout
+
+from transcripts import TURNS_COLLECTION
+
+# --- Call search ---
+# Filters: phone, name (prefix), status, created_at range, spoken text.
+# Every filter shape maps onto one of the indexes below, results come back
+# newest first with keyset pagination on (created_at, _id), and the planner
+# guard refuses any shape whose winning plan contains a COLLSCAN or has no
+# bounded index range on the filter. The plan is checked once per shape
+# (queryPlanner explain, nothing executed); what the filter values cost (a
+# very common name prefix, a wide date range) is bounded by SEARCH_MAX_TIME_MS
+# on the search itself.
+SEARCH_MAX_LIMIT = 100
+SEARCH_MAX_TIME_MS = 2000
+# Text matches are resolved to call ids first; more than this is too vague to page through
+TEXT_MAX_CALLS = 1000
+FULL_RANGE = ("[MinKey, MaxKey]", "[MaxKey, MinKey]")
+
+HEADER_INDEXES = [
+    [("call_id", ASCENDING)],
+    [("created_at", DESCENDING), ("_id", DESCENDING)],
+    [("phone_no", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+    [("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+    [("name", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+]
+SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+
+
+class SearchError(ValueError):
+    pass
+
+
+async def ensure_search_indexes(db):
+    for keys in HEADER_INDEXES:
+        await db.conversation_history.create_index(keys)
+    # Bucketed turns (transcripts.py): one text index over everything said
+    await db[TURNS_COLLECTION].create_index([("turns.text", TEXT)], default_language="none")
+    # Headers first written by start_recording's upsert never got created_at;
+    # the ObjectId holds the insert time
+    await db.conversation_history.update_many({"created_at": {"$exists": False}},
+                                              [{"$set": {"created_at": {"$toDate": "$_id"}}}])
+
+
+def sort_time(doc):
+    return doc.get("created_at") or doc["_id"].generation_time.replace(tzinfo=None)
+
+
+def encode_cursor(doc):
+    raw = f"{sort_time(doc).isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, oid = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(created_at), ObjectId(oid)
+    except Exception:
+        raise SearchError("invalid cursor")
+
+
+async def text_call_ids(db, text):
+    ids = set()
+    cursor = db[TURNS_COLLECTION].find({"$text": {"$search": text}}, {"call_id": 1, "_id": 0})
+    async for b in cursor.max_time_ms(SEARCH_MAX_TIME_MS):
+        ids.add(b["call_id"])
+        if len(ids) > TEXT_MAX_CALLS:
+            raise SearchError(f"text matches more than {TEXT_MAX_CALLS} calls, add filters or a more specific phrase")
+    return list(ids)
+
+
+def build_filter(phone=None, name=None, status=None, date_from=None, date_to=None):
+    query = {}
+    if phone:
+        query["phone_no"] = phone
+    if name:
+        # Anchored prefix so the name index is used
+        query["name"] = {"$regex": f"^{re.escape(name)}"}
+    if status:
+        query["status"] = status
+    if date_from or date_to:
+        query["created_at"] = {}
+        if date_from:
+            query["created_at"]["$gte"] = date_from
+        if date_to:
+            query["created_at"]["$lt"] = date_to
+    return query
+
+
+def query_shape(query):
+    return tuple(sorted(k if k != "$and" else "keyset" for k in query))
+
+
+def _stages(plan):
+    yield plan
+    children = [plan.get("inputStage")] + plan.get("inputStages", []) + [plan.get("queryPlan")]
+    for c in children:
+        if c:
+            yield from _stages(c)
+
+
+def plan_problem(query, explain):
+    """Why this plan can't serve any search of this shape, or None."""
+    stages = list(_stages(explain["queryPlanner"]["winningPlan"]))
+    if any(st.get("stage") == "COLLSCAN" for st in stages):
+        return "would scan the whole collection"
+    # Filtered searches must narrow an index range on a filtered field; an
+    # unbounded walk of the sort index with a FETCH filter reads everything
+    fields = {k for k in query if not k.startswith("$")}
+    bounded = any(bounds not in ([FULL_RANGE[0]], [FULL_RANGE[1]])
+                  for st in stages if st.get("stage") == "IXSCAN"
+                  for field, bounds in st.get("indexBounds", {}).items() if field in fields)
+    if fields and not bounded:
+        return "has no index range on the filter"
+    return None
+
+
+class CallSearch:
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.conversation_history
+        self.plan_problems = {}  # query shape -> problem or None, explain runs once per shape
+
+    async def check_plan(self, query, limit):
+        shape = query_shape(query)
+        if shape not in self.plan_problems:
+            # queryPlanner only: picks the plan without running the query
+            explain = await self.db.command("explain", {"find": self.collection.name, "filter": query,
+                                                        "sort": dict(SORT), "limit": limit},
+                                            verbosity="queryPlanner")
+            self.plan_problems[shape] = plan_problem(query, explain)
+        problem = self.plan_problems[shape]
+        if problem:
+            raise SearchError(f"search on {', '.join(shape) or 'nothing'} {problem}")
+
+    async def search(self, phone=None, name=None, status=None, date_from=None, date_to=None,
+                     text=None, cursor=None, limit=50):
+        limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+        query = build_filter(phone, name, status, date_from, date_to)
+        if text:
+            query["call_id"] = {"$in": await text_call_ids(self.db, text)}
+        if cursor:
+            created_at, oid = decode_cursor(cursor)
+            query["$and"] = [{"$or": [{"created_at": {"$lt": created_at}},
+                                      {"created_at": created_at, "_id": {"$lt": oid}}]}]
+
+        await self.check_plan(query, limit + 1)
+        try:
+            calls = await (self.collection.find(query, {"messages": 0})
+                           .sort(SORT).limit(limit + 1).max_time_ms(SEARCH_MAX_TIME_MS)
+                           .to_list(length=limit + 1))
+        except ExecutionTimeout:
+            raise SearchError(f"search took over {SEARCH_MAX_TIME_MS}ms, add filters or narrow the date range")
+        next_cursor = encode_cursor(calls[limit - 1]) if len(calls) > limit else None
+        calls = calls[:limit]
+        for call in calls:
+            call["_id"] = str(call["_id"])
+        return {"calls": calls, "next_cursor": next_cursor}
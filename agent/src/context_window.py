@@ -0,0 +1,168 @@
+import os
+import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from kb import recruitment_steps
+
+from lang_score import named_languages
+from triage import NO_WORDS, STEP_TOKENS, YES_WORDS, step_overlap, tokenize
+
+# --- Bounded conversation context ---
+# The LLM sees the instructions, a short "known so far" summary and only the
+# last CONTEXT_KEEP_TURNS exchanges verbatim, within CONTEXT_TOKEN_BUDGET. Older
+# turns are folded into the summary. The summary is a dict of per-step facts
+# ("fact" in kb.py), updated locally from each answer, so no extra model call
+# is needed. compact() trims the session's chat context after a reply has
+# played, off the critical path, so every turn sends about the same number of
+# tokens however long the call (or the previous call, on reconnection) runs.
+KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))
+TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))  # history only; instructions are extra
+SUMMARY_ID = "context_summary"
+QUOTE_WORDS = 12
+
+# Negations that answer "yes", rewritten before the yes/no words are read
+AFFIRMING_NEGATIONS = re.compile(
+    r"\b(no|not|koi|(do not|don't|dont) have)( an?| any)? (problem|issue|worries|worry|doubt|objection)s?\b|"
+    r"\bnot (busy|an issue)\b|\bwhy not\b|\b(problem|dikkat|issue) (nahi|nahin)\b", re.IGNORECASE)
+# Yes/no words that aren't an answer here: "right now I'm free"
+NOT_ANSWERS = re.compile(r"\bright now\b", re.IGNORECASE)
+# Undecided: no yes/no value, the quote stands alone
+UNSURE = re.compile(r"\bnot (sure|certain)\b|\b(don't|do not|dont) know\b|\bmaybe\b|\bpata nahi\b", re.IGNORECASE)
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English/Hinglish; good enough for a budget
+    return len(text or "") // 4 + 1
+
+
+def yes_no(text):
+    """
+    The first yes/no word decides, after negations that mean yes are rewritten.
+
+    >>> [yes_no(t) for t in ["yes no problem", "no problem, that is okay", "sure, I am not busy tomorrow"]]
+    ['yes', 'yes', 'yes']
+    >>> [yes_no(t) for t in ["No, I'm not interested", "I can't, sorry", "right now I'm busy", "haan ji"]]
+    ['no', 'no', 'no', 'yes']
+    >>> [yes_no(t) for t in ["I do not have any problem", "I don't have an issue with that"]]
+    ['yes', 'yes']
+    >>> [yes_no(t) for t in ["I will tell you later", "I am not sure", "maybe, I don't know yet"]]
+    [None, None, None]
+    """
+    if UNSURE.search(text or ""):
+        return None
+    text = NOT_ANSWERS.sub(" ", AFFIRMING_NEGATIONS.sub(" yes ", text or ""))
+    for word in tokenize(text):
+        if word in YES_WORDS:
+            return "yes"
+        if word in NO_WORDS:
+            return "no"
+    return None
+
+
+def clip(text):
+    words = (text or "").split()
+    return '"' + " ".join(words[:QUOTE_WORDS]) + ("..." if len(words) > QUOTE_WORDS else "") + '"'
+
+
+def answer_fact(step, text):
+    """
+    One short value per answered step: the languages named, or a clipped quote.
+    Yes/no steps keep the quote next to the value, so a misread can be corrected.
+
+    >>> answer_fact(4, "Yes, HSR Layout is fine")
+    'yes - "Yes, HSR Layout is fine"'
+    """
+    if step == 5:
+        found = named_languages(text)
+        if found:
+            return ", ".join(l.capitalize() for l in found)
+    if recruitment_steps.get(str(step), {}).get("turn") == "yes_no":
+        answer = yes_no(text)
+        if answer:
+            return f"{answer} - {clip(text)}"
+    return clip(text)
+
+
+def message_text(m):
+    # Live state uses "content", transcripts loaded from Mongo use "text"
+    return m.get("content") or m.get("text") or ""
+
+
+class ConversationWindow:
+    def __init__(self, keep_turns=KEEP_TURNS, token_budget=TOKEN_BUDGET):
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.facts = {}  # step -> value; later answers to the same step win
+
+    def record_answer(self, step, text):
+        if str(step) in recruitment_steps and text:
+            self.facts[int(step)] = answer_fact(int(step), text)
+
+    def seed_from_transcript(self, messages):
+        """Reconnection: facts from the previous call's transcript, matching each answer to the step just asked."""
+        step = None
+        for m in messages:
+            text = message_text(m)
+            if m.get("role") == "assistant":
+                for s in STEP_TOKENS:
+                    if step_overlap(text, s) >= 0.5:
+                        step = s
+            elif m.get("role") == "user" and step:
+                self.record_answer(step, text)
+
+    def summary(self):
+        if not self.facts:
+            return ""
+        lines = [f"- {recruitment_steps[str(s)].get('fact', f'Step {s}')}: {v}" for s, v in sorted(self.facts.items())]
+        return "Known so far about the candidate (earlier turns, summarized):\n" + "\n".join(lines)
+
+    def trim_messages(self, messages):
+        """Last keep_turns exchanges of a [{role, content|text}] list (state["messages"], reconnection seed)."""
+        user_idx = [i for i, m in enumerate(messages) if m.get("role") == "user"]
+        if len(user_idx) <= self.keep_turns:
+            return list(messages)
+        return messages[user_idx[-self.keep_turns]:]
+
+    # --- Session chat context ---
+    def _cut(self, items):
+        """
+        Index of the oldest item kept verbatim. Cuts fall on an exchange boundary: the
+        assistant message just before a user message, so tool calls stay with their output.
+        """
+        starts = []
+        for i, it in enumerate(items):
+            if it.type == "message" and it.role == "user":
+                while i > 0 and items[i - 1].type == "message" and items[i - 1].role == "assistant":
+                    i -= 1
+                starts.append(i)
+        if not starts:
+            return 0
+        cuts = starts[-self.keep_turns:]
+        cut = 0 if len(starts) <= self.keep_turns else cuts[0]
+        for next_cut in cuts[1:]:
+            if self._tokens(items[cut:]) <= self.token_budget:
+                break
+            cut = next_cut
+        return cut
+
+    @staticmethod
+    def _tokens(items):
+        return sum(estimate_tokens(it.text_content) for it in items if it.type == "message" and it.text_content)
+
+    async def compact(self, agent):
+        from livekit.agents.llm import ChatMessage
+
+        chat_ctx = agent.chat_ctx.copy()
+        items = chat_ctx.items
+        history_start = next((i for i, it in enumerate(items)
+                              if not (it.type == "message" and it.role in ("system", "developer"))), len(items))
+        head = [it for it in items[:history_start] if it.id != SUMMARY_ID]
+        history = items[history_start:]
+        cut = self._cut(history)
+        if cut == 0 and self._tokens(history) <= self.token_budget:
+            return
+        summary = self.summary()
+        kept = head + ([ChatMessage(id=SUMMARY_ID, role="system", content=[summary])] if summary else []) + history[cut:]
+        items[:] = kept
+        await agent.update_chat_ctx(chat_ctx)
@@ -0,0 +1,430 @@
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import math
+import os
+import random
+import time
+from collections import deque
+
+logger = logging.getLogger("dialer")
+
+# --- Capacity-paced outbound dialer ---
+# Pops leads from a Redis list and dials them into their own rooms with
+# create_sip_participant (outbound trunk in outbound_trunk.json). Once the
+# callee answers, the agent is dispatched to the room by name (AGENT_NAME, set
+# to the same value on the agent workers) and finds the lead via the vici_id
+# participant attribute, the same way it does for inbound calls. A named worker
+# is no longer auto-dispatched, so the inbound dispatch rule needs the agent in
+# its room config too ("roomConfig": {"agents": [{"agentName": ...}]}).
+# Dispatching only after the answer keeps ringing calls out of the workers'
+# job slots, so they are counted once, as "ringing" below.
+#
+# Each tick:
+#   free      free job slots, from the workers' /metrics (max_calls - active_jobs, 0 for workers at pressure >= 1),
+#             minus calls answered too recently to be in those numbers
+#   releases  live calls expected to end while a new call rings: live * ring_time / handle_time
+#   target    ringing calls wanted = min((free + releases) / answer_rate, (free + releases) * DIALER_MAX_OVERDIAL)
+# and (target - ringing) calls are placed, at most DIALER_MAX_CPS per second.
+# With DIALER_MAX_OVERDIAL=1 (default) every ringing call has a slot even if
+# all of them answer. Raise it only after checking the simulation's
+# oversubscribed count:
+#
+#   python dialer.py                                   # live
+#   python dialer.py simulate --slots 20 --answer-rate 0.3 --overdial 1,1.2,1.5
+LIVEKIT_URL = os.getenv("LIVEKIT_URL", "")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+OUTBOUND_TRUNK_ID = os.getenv("OUTBOUND_TRUNK_ID", "")
+AGENT_NAME = os.getenv("AGENT_NAME", "")
+WORKER_METRICS_URLS = [u for u in os.getenv("WORKER_METRICS_URLS", "http://localhost:8082/metrics").split(",") if u]
+LEADS_KEY = os.getenv("DIALER_LEADS_KEY", "dialer:leads")  # RPUSH JSON {"vici_id", "phone_no", "name"}
+RESULTS_STREAM = "dialer:results"
+MAX_OVERDIAL = float(os.getenv("DIALER_MAX_OVERDIAL", "1.0"))
+MAX_CPS = float(os.getenv("DIALER_MAX_CPS", "2"))
+RING_TIMEOUT = 30
+TICK = 1.0
+# An answered call shows up in its worker's active_jobs only after dispatch and
+# the worker's next load sample; until then it is subtracted here
+METRICS_LAG_S = 3.0
+ROOM_POLL_INTERVAL = 5.0
+# Starting estimates, replaced by measurements as calls complete
+INITIAL_ANSWER_RATE = 0.3
+INITIAL_RING_S = 15.0
+INITIAL_AHT_S = 240.0
+MIN_ANSWER_RATE = 0.05
+SMOOTHING = 0.05
+
+
+class Clock:
+    """Seconds of call time. The simulation runs faster than real time (scale < 1)."""
+
+    def __init__(self, scale=1.0):
+        self.scale = scale
+        self.origin = time.monotonic()
+
+    def now(self):
+        return (time.monotonic() - self.origin) / self.scale
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds * self.scale)
+
+
+class Ewma:
+    def __init__(self, initial, alpha=SMOOTHING):
+        self.value = initial
+        self.alpha = alpha
+
+    def add(self, sample):
+        self.value += self.alpha * (sample - self.value)
+
+
+class Pacer:
+    def __init__(self, max_overdial=MAX_OVERDIAL):
+        self.max_overdial = max_overdial
+        self.answer_rate = Ewma(INITIAL_ANSWER_RATE)
+        self.ring_s = Ewma(INITIAL_RING_S)
+        self.aht_s = Ewma(INITIAL_AHT_S)
+
+    def record_attempt(self, answered, ring_s):
+        self.answer_rate.add(1.0 if answered else 0.0)
+        if answered:
+            self.ring_s.add(ring_s)
+
+    def record_end(self, handle_s):
+        self.aht_s.add(handle_s)
+
+    def to_dial(self, free, ringing, live):
+        releases = live * min(1.0, self.ring_s.value / max(self.aht_s.value, 1.0))
+        available = max(free + releases, 0.0)
+        p = max(self.answer_rate.value, MIN_ANSWER_RATE)
+        target = min(available / p, available * self.max_overdial)
+        return max(0, math.floor(target + 1e-9) - ringing)
+
+    def snapshot(self):
+        return {"answer_rate": round(self.answer_rate.value, 3), "ring_s": round(self.ring_s.value, 1),
+                "aht_s": round(self.aht_s.value, 1), "max_overdial": self.max_overdial}
+
+
+# --- Live backends ---
+class WorkerCapacity:
+    """Free job slots across agent workers, from their /metrics endpoints."""
+
+    def __init__(self, urls=WORKER_METRICS_URLS):
+        self.urls = urls
+        self.http = None
+
+    async def free_slots(self):
+        import aiohttp
+
+        if self.http is None:
+            self.http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2))
+        free = 0
+        for url in self.urls:
+            try:
+                async with self.http.get(url) as resp:
+                    m = await resp.json()
+            except Exception as e:
+                logger.warning(f"⚠️ Worker metrics unavailable at {url}: {e}")
+                continue  # unreachable worker contributes nothing
+            if m.get("pressure", 0) < 1.0:
+                free += max(0, int(m.get("max_calls", 0)) - int((m.get("load") or {}).get("active_jobs", 0)))
+        return free
+
+    async def close(self):
+        if self.http:
+            await self.http.close()
+
+
+class LiveKitSIP:
+    def __init__(self, trunk_id=OUTBOUND_TRUNK_ID, agent_name=AGENT_NAME):
+        from livekit import api
+
+        if not agent_name:
+            raise SystemExit("AGENT_NAME is not set: the dialer dispatches the agent by name once a call is answered")
+        self.api = api
+        self.lk_api = api.LiveKitAPI(LIVEKIT_URL.replace("ws", "http"), os.getenv("LIVEKIT_API_KEY"), os.getenv("LIVEKIT_API_SECRET"))
+        self.trunk_id = trunk_id
+        self.agent_name = agent_name
+        self.live_rooms = {}  # room name -> future resolved when the room closes
+        self.poller = None
+
+    async def dial(self, lead, room_name):
+        """True once the callee answers, False for no answer / busy / failure."""
+        try:
+            await self.lk_api.sip.create_sip_participant(self.api.CreateSIPParticipantRequest(
+                sip_trunk_id=self.trunk_id,
+                sip_call_to=lead["phone_no"],
+                room_name=room_name,
+                participant_identity=f"sip-{lead['vici_id']}",
+                participant_name=lead.get("name", "Candidate"),
+                participant_attributes={"vici_id": lead["vici_id"]},
+                wait_until_answered=True,
+                ringing_timeout=datetime.timedelta(seconds=RING_TIMEOUT),
+            ))
+        except Exception as e:
+            logger.debug(f"Dial {lead['vici_id']} not answered: {e}")
+            return False
+        try:
+            await self.lk_api.agent_dispatch.create_dispatch(self.api.CreateAgentDispatchRequest(
+                agent_name=self.agent_name, room=room_name))
+        except Exception as e:
+            # Answered but no agent will join: hang up rather than leave the callee in silence
+            logger.error(f"❌ Agent dispatch for {lead['vici_id']} failed: {e}")
+            try:
+                await self.lk_api.room.delete_room(self.api.DeleteRoomRequest(room=room_name))
+            except Exception as e:
+                logger.warning(f"⚠️ Could not close {room_name}: {e}")
+            return False
+        return True
+
+    async def wait_ended(self, room_name):
+        ended = self.live_rooms[room_name] = asyncio.get_running_loop().create_future()
+        if self.poller is None or self.poller.done():
+            self.poller = asyncio.create_task(self._poll_rooms())
+        await ended
+
+    async def _poll_rooms(self):
+        # One list_rooms for every live call instead of one request per call
+        while self.live_rooms:
+            await asyncio.sleep(ROOM_POLL_INTERVAL)
+            try:
+                res = await self.lk_api.room.list_rooms(self.api.ListRoomsRequest(names=list(self.live_rooms)))
+            except Exception as e:
+                logger.warning(f"⚠️ list_rooms failed: {e}")
+                continue
+            open_rooms = {room.name for room in res.rooms if room.num_participants > 0}
+            for name in [n for n in self.live_rooms if n not in open_rooms]:
+                self.live_rooms.pop(name).set_result(True)
+
+    async def close(self):
+        await self.lk_api.aclose()
+
+
+class RedisLeads:
+    def __init__(self, url=REDIS_URL):
+        import redis.asyncio as aioredis
+
+        self.redis = aioredis.from_url(url, decode_responses=True)
+
+    async def pop(self, n):
+        if n <= 0:
+            return []
+        raw = await self.redis.lpop(LEADS_KEY, n) or []
+        return [json.loads(x) for x in raw]
+
+    async def record(self, result):
+        await self.redis.xadd(RESULTS_STREAM, {"result": json.dumps(result)}, maxlen=100000, approximate=True)
+
+    async def close(self):
+        await self.redis.close()
+
+
+# --- Dialer ---
+class Dialer:
+    def __init__(self, leads, sip, capacity, pacer=None, clock=None, max_cps=MAX_CPS):
+        self.leads = leads
+        self.sip = sip
+        self.capacity = capacity
+        self.pacer = pacer or Pacer()
+        self.clock = clock or Clock()
+        self.max_cps = max_cps
+        self.ringing = 0
+        self.live = 0
+        self.recent_answers = deque()
+        self.next_dial_at = 0.0
+        self.tasks = set()
+        self.counts = {"dialed": 0, "answered": 0, "no_answer": 0, "completed": 0}
+
+    async def run(self, stop=None):
+        stop = stop or asyncio.Event()
+        last_log = 0.0
+        while not stop.is_set():
+            while self.recent_answers and self.clock.now() - self.recent_answers[0] > METRICS_LAG_S:
+                self.recent_answers.popleft()
+            free = max(0, await self.capacity.free_slots() - len(self.recent_answers))
+            n = self.pacer.to_dial(free, self.ringing, self.live)
+            # CPS limit: don't dial more than the trunk allows before the next tick
+            n = min(n, max(1, int(self.max_cps * TICK)))
+            leads = await self.leads.pop(n)
+            for lead in leads:
+                await self._wait_cps()
+                task = asyncio.create_task(self._call(lead))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+            if self.clock.now() - last_log >= 60:
+                last_log = self.clock.now()
+                logger.info(f"📞 free={free} ringing={self.ringing} live={self.live} {self.counts} {self.pacer.snapshot()}")
+            await self.clock.sleep(TICK)
+        if self.tasks:
+            await asyncio.wait(self.tasks)
+
+    async def _wait_cps(self):
+        now = self.clock.now()
+        if now < self.next_dial_at:
+            await self.clock.sleep(self.next_dial_at - now)
+        self.next_dial_at = max(now, self.next_dial_at) + 1.0 / self.max_cps
+
+    async def _call(self, lead):
+        room_name = f"outbound-{lead['vici_id']}"
+        self.ringing += 1
+        self.counts["dialed"] += 1
+        started = self.clock.now()
+        try:
+            answered = await self.sip.dial(lead, room_name)
+        finally:
+            self.ringing -= 1
+        answered_at = self.clock.now()
+        self.pacer.record_attempt(answered, answered_at - started)
+        result = {"vici_id": lead["vici_id"], "phone_no": lead["phone_no"], "answered": answered,
+                  "ring_s": round(answered_at - started, 1)}
+        if not answered:
+            self.counts["no_answer"] += 1
+            await self.leads.record(result)
+            return
+        self.counts["answered"] += 1
+        self.recent_answers.append(answered_at)
+        self.live += 1
+        try:
+            await self.sip.wait_ended(room_name)
+        finally:
+            self.live -= 1
+        self.counts["completed"] += 1
+        result["handle_s"] = round(self.clock.now() - answered_at, 1)
+        self.pacer.record_end(result["handle_s"])
+        await self.leads.record(result)
+
+
+async def run_live():
+    dialer = Dialer(RedisLeads(), LiveKitSIP(), WorkerCapacity())
+    logger.info(f"🚀 Outbound dialer started (max overdial {MAX_OVERDIAL}, {MAX_CPS} cps)")
+    try:
+        await dialer.run()
+    finally:
+        await asyncio.gather(dialer.leads.close(), dialer.sip.close(), dialer.capacity.close())
+
+
+# --- Simulation ---
+# Fake SIP and workers sharing one pool of slots, on a sped-up clock. Reports
+# utilization and how often an answered call found no free slot.
+class FakeLeads:
+    def __init__(self):
+        self.n = 0
+        self.results = []
+
+    async def pop(self, n):
+        leads = [{"vici_id": f"sim{self.n + i}", "phone_no": f"9{self.n + i:09d}"} for i in range(n)]
+        self.n += n
+        return leads
+
+    async def record(self, result):
+        self.results.append(result)
+
+
+class FakePool:
+    """Fake SIP trunk + agent workers: answered calls occupy a slot for their handle time."""
+
+    def __init__(self, clock, slots, answer_rate, ring_s, aht_s, dispatch_lag_s=2.0):
+        self.clock = clock
+        self.slots = slots
+        self.answer_rate = answer_rate
+        self.ring_s = ring_s
+        self.aht_s = aht_s
+        self.dispatch_lag_s = dispatch_lag_s
+        self.busy = 0
+        self.reported_busy = 0
+        self.oversubscribed = 0
+        self.busy_area = 0.0
+        self.last_change = clock.now()
+
+    def _account(self):
+        now = self.clock.now()
+        self.busy_area += min(self.busy, self.slots) * (now - self.last_change)
+        self.last_change = now
+
+    async def free_slots(self):
+        # Workers report what they had a moment ago, like the real /metrics
+        return max(0, self.slots - self.reported_busy)
+
+    async def dial(self, lead, room_name):
+        answers = random.random() < self.answer_rate
+        await self.clock.sleep(random.expovariate(1 / self.ring_s) if answers else RING_TIMEOUT)
+        if not answers:
+            return False
+        self._account()
+        self.busy += 1
+        if self.busy > self.slots:
+            self.oversubscribed += 1
+        asyncio.get_running_loop().call_later(self.dispatch_lag_s * self.clock.scale, self._reported, 1)
+        return True
+
+    def _reported(self, delta):
+        self.reported_busy += delta
+
+    async def wait_ended(self, room_name):
+        await self.clock.sleep(random.lognormvariate(math.log(self.aht_s), 0.5))
+        self._account()
+        self.busy -= 1
+        self._reported(-1)
+
+    def utilization(self):
+        self._account()
+        return self.busy_area / (self.slots * self.clock.now())
+
+
+async def simulate_one(args, overdial):
+    clock = Clock(args.time_scale)
+    pool = FakePool(clock, args.slots, args.answer_rate, args.ring, args.aht)
+    leads = FakeLeads()
+    dialer = Dialer(leads, pool, pool, Pacer(overdial), clock, max_cps=args.cps)
+    stop = asyncio.Event()
+    asyncio.get_running_loop().call_later(args.minutes * 60 * args.time_scale, stop.set)
+    await dialer.run(stop)
+    answered = dialer.counts["answered"]
+    return {
+        "overdial": overdial,
+        "dialed": dialer.counts["dialed"],
+        "answered": answered,
+        "answered_per_hour": round(answered / (args.minutes / 60)),
+        "utilization": round(pool.utilization(), 3),
+        "oversubscribed": pool.oversubscribed,
+        "oversubscribed_pct": round(100 * pool.oversubscribed / answered, 2) if answered else 0.0,
+        "learned": dialer.pacer.snapshot(),
+    }
+
+
+async def simulate(args):
+    print(f"{'overdial':>8} {'dialed':>7} {'answered':>9} {'ans/h':>7} {'util':>6} {'oversub':>8} {'%':>6}")
+    results = []
+    for overdial in args.overdial:
+        res = await simulate_one(args, overdial)
+        results.append(res)
+        print(f"{overdial:>8} {res['dialed']:>7} {res['answered']:>9} {res['answered_per_hour']:>7} "
+              f"{res['utilization']:>6} {res['oversubscribed']:>8} {res['oversubscribed_pct']:>6}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Outbound dialer paced by agent-worker capacity")
+    sub = parser.add_subparsers(dest="command")
+    sim = sub.add_parser("simulate", help="tune pacing against a fake trunk and workers")
+    sim.add_argument("--slots", type=int, default=20, help="total agent job slots")
+    sim.add_argument("--answer-rate", type=float, default=0.3)
+    sim.add_argument("--ring", type=float, default=12.0, help="mean ring time before answer (s)")
+    sim.add_argument("--aht", type=float, default=180.0, help="median handle time (s)")
+    sim.add_argument("--cps", type=float, default=MAX_CPS)
+    sim.add_argument("--minutes", type=float, default=120, help="simulated minutes per run")
+    sim.add_argument("--time-scale", type=float, default=0.002, help="real seconds per simulated second")
+    sim.add_argument("--overdial", default="1.0", help="comma separated DIALER_MAX_OVERDIAL values to compare")
+    sim.add_argument("--out")
+    args = parser.parse_args()
+    if args.command == "simulate":
+        logging.getLogger("dialer").setLevel(logging.WARNING)
+        args.overdial = [float(x) for x in args.overdial.split(",") if x]
+        asyncio.run(simulate(args))
+    else:
+        asyncio.run(run_live())
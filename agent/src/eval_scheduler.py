@@ -0,0 +1,194 @@
+import asyncio
+import datetime
+import logging
+import os
+import random
+import time
+
+import openai
+
+logger = logging.getLogger("evaluator")
+
+# --- Rate-limit-aware model scheduler ---
+# Sits in front of the evaluator's model calls:
+#   - token buckets for requests/min and tokens/min (set these to the account limits)
+#   - adaptive concurrency: +1 after a run of successes, halved on 429/5xx (AIMD)
+#   - transient errors retry with full-jitter backoff (Retry-After wins when sent)
+#   - calls that still fail go to the dead-letter collection, not "failed_error"
+EVAL_RPM = int(os.getenv("EVAL_RPM", "50"))
+EVAL_TPM = int(os.getenv("EVAL_TPM", "200000"))
+EVAL_MAX_CONCURRENCY = int(os.getenv("EVAL_MAX_CONCURRENCY", "8"))
+EVAL_MAX_ATTEMPTS = int(os.getenv("EVAL_MAX_ATTEMPTS", "6"))
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 120.0
+# 429s from one burst arrive together; only the first of them halves the limit
+DECREASE_COOLDOWN = 5.0
+DEAD_LETTER_COLLECTION = "evaluation_dead_letter"
+
+TRANSIENT_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class RetriesExhausted(Exception):
+    def __init__(self, attempts, last_error):
+        super().__init__(f"gave up after {attempts} attempts: {last_error}")
+        self.attempts = attempts
+        self.last_error = last_error
+
+
+class TokenBucket:
+    """Refills continuously at per_minute/60 per second, up to one minute of budget."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        # A single request bigger than the bucket would wait forever; let it drain the bucket instead
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta):
+        """Corrects an estimate once the real usage is known (can go negative = debt)."""
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+    def drain(self, seconds):
+        """Provider said to back off: stop handing out budget for a while."""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit: grows by one per `limit` successes, halves on overload."""
+
+    def __init__(self, max_limit):
+        self.max_limit = max_limit
+        self.limit = max(1, max_limit // 2)
+        self.active = 0
+        self.successes = 0
+        self.last_decrease = 0.0
+        self.cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def __aexit__(self, *exc):
+        async with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+    async def on_success(self):
+        async with self.cond:
+            self.successes += 1
+            if self.successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self.successes = 0
+                self.cond.notify_all()
+
+    async def on_overload(self):
+        now = time.monotonic()
+        if now - self.last_decrease < DECREASE_COOLDOWN:
+            return
+        self.last_decrease = now
+        async with self.cond:
+            self.limit = max(1, self.limit // 2)
+            self.successes = 0
+        logger.warning(f"🐢 Provider overloaded, eval concurrency -> {self.limit}")
+
+
+def retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def is_overload(error):
+    return isinstance(error, (openai.RateLimitError, openai.InternalServerError))
+
+
+class ModelScheduler:
+    def __init__(self, rpm=EVAL_RPM, tpm=EVAL_TPM, max_concurrency=EVAL_MAX_CONCURRENCY, max_attempts=EVAL_MAX_ATTEMPTS):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.max_attempts = max_attempts
+        self.stats = {"ok": 0, "retried": 0, "overloaded": 0, "dead_lettered": 0}
+
+    async def run(self, make_call, est_tokens):
+        """
+        make_call: coroutine function doing one model request (client retries off).
+        Non-transient errors are raised straight away; transient ones raise
+        RetriesExhausted after max_attempts.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            await self.requests.acquire()
+            await self.tokens.acquire(est_tokens)
+            try:
+                async with self.limiter:
+                    response = await make_call()
+            except TRANSIENT_ERRORS as e:
+                wait = retry_after(e)
+                if is_overload(e):
+                    self.stats["overloaded"] += 1
+                    await self.limiter.on_overload()
+                    if wait:
+                        self.requests.drain(wait)
+                if attempt == self.max_attempts:
+                    self.stats["dead_lettered"] += 1
+                    raise RetriesExhausted(attempt, e) from e
+                # Full jitter keeps retries from arriving together after a shared 429
+                delay = wait or random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+                self.stats["retried"] += 1
+                logger.info(f"🔁 Eval request failed ({type(e).__name__}), retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            usage = getattr(response, "usage", None)
+            if usage and usage.total_tokens:
+                self.tokens.adjust(usage.total_tokens - est_tokens)
+            await self.limiter.on_success()
+            self.stats["ok"] += 1
+            return response
+
+
+async def dead_letter(db, doc, error):
+    """Parks a call whose model requests kept failing; `requeue_dead_letters` puts it back."""
+    await db[DEAD_LETTER_COLLECTION].update_one(
+        {"call_id": doc.get("call_id")},
+        {"$set": {"error": str(error), "attempts": getattr(error, "attempts", None), "failed_at": datetime.datetime.utcnow()},
+         "$inc": {"times_dead_lettered": 1}},
+        upsert=True
+    )
+    await db.conversation_history.update_one(
+        {"_id": doc["_id"]},
+        {"$set": {"status": "eval_dead_letter", "evaluation_status": "dead_letter", "error_log": str(error)}}
+    )
+
+
+async def requeue_dead_letters(db):
+    requeued = 0
+    async for entry in db[DEAD_LETTER_COLLECTION].find():
+        await db.conversation_history.update_one(
+            {"call_id": entry["call_id"], "status": "eval_dead_letter"},
+            {"$set": {"status": "yet_to_evaluate"}, "$unset": {"evaluation_status": ""}}
+        )
+        await db[DEAD_LETTER_COLLECTION].delete_one({"_id": entry["_id"]})
+        requeued += 1
+    return requeued
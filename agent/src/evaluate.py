@@ -1,14 +1,20 @@
 import json
-import aiohttp
 import asyncio
 import base64
 import os
 import datetime
 import logging
 import re  # Added for robust JSON extraction
+import sys
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
-from openai import OpenAI
+from openai import AsyncOpenAI
+from egress_tracker import record_egress_result
+from eval_scheduler import EVAL_MAX_CONCURRENCY, ModelScheduler, RetriesExhausted, dead_letter, requeue_dead_letters
+from event_bus import WEBHOOKS_ENABLED, consume, parse_payload
+from transcripts import load_transcript, load_turn_count
+from triage import is_hot_lead, record_triage, triage, triage_evaluation
+from vici_callbacks import CallbackDispatcher, ensure_indexes as ensure_callback_indexes
 
 load_dotenv()
 
@@ -24,31 +30,71 @@ client = AsyncIOMotorClient(MONGO_URL)
 db = client.asterisk
 collection = db.conversation_history
 
-# OpenAI Setup
-openai_client = OpenAI()
+# OpenAI Setup (retries are the scheduler's job, not the client's)
+openai_client = AsyncOpenAI(max_retries=0, timeout=120)
+scheduler = ModelScheduler()
+callbacks = CallbackDispatcher(db, VICIDIAL_API_URL)
+# Rough gpt-4o audio input cost: ~10 tokens per second, mp3 recordings at ~4 KB/s
+AUDIO_TOKENS_PER_BYTE = 10 / 4000
+PROMPT_TOKENS = 600
+
+EVAL_QUERY = {
+    "status": "yet_to_evaluate",
+    "call_id": {"$exists": True},
+    "ready_for_eval":{"$eq": True},
+    "name": {"$exists": True},
+    # At least 5 turns; messages.4 covers calls not yet migrated to transcript buckets
+    "$or": [{"turn_count": {"$gte": 5}}, {"messages.4": {"$exists": True}}],
+}
+# Headers only; load_transcript/load_turn_count read a legacy messages array when there is one
+EVAL_PROJECTION = {"messages": 0}
+# Recordings reach this host by file sync after the egress finishes; one still
+# missing this long after finalized_at is treated as lost
+RECORDING_SYNC_GRACE = datetime.timedelta(seconds=int(os.getenv("RECORDING_SYNC_GRACE_S", "1800")))
+# With webhooks on, egress_ended drives evaluation and the sweep only catches leftovers
+SWEEP_INTERVAL = 300 if WEBHOOKS_ENABLED else 10
 
 async def evaluate_call(doc):
     vici_id = doc.get("call_id")
-    phone_no = doc.get("phone_no", "Unknown")
     candidate_name = doc.get("name", "Candidate")
-    messages = doc.get("messages", [])
+    turns = await load_turn_count(db, doc)
     file_path = f"/opt/greet/recordings/{vici_id}.mp3"
 
-    if not os.path.exists(file_path):
-        logger.warning(f"Recording not found for {vici_id}")
-        return
-
-    if not doc.get("messages") or not candidate_name:
+    if not turns or not candidate_name:
         logger.warning(f"⚠️ Skipping {vici_id}: Missing required fields (name/messages).")
         await collection.update_one({"_id": doc["_id"]}, {"$set": {"evaluation_status": "skipped_missing_data"}})
         return
 
-    if len(messages) < 4:  # This means "has at least 3 messages"
-        logger.info(f"⏭️ Skipping {vici_id}: Conversation too short ({len(messages)} turns).")
+    if turns < 4:  # This means "has at least 3 messages"
+        logger.info(f"⏭️ Skipping {vici_id}: Conversation too short ({turns} turns).")
         # Mark as evaluated so we don't keep checking it
         await collection.update_one({"_id": doc["_id"]}, {"$set": {"evaluation_status": "skipped_too_short"}})
         return
 
+    # Transcript triage: clear-cut calls never reach the audio model
+    messages = await load_transcript(db, vici_id, doc)
+    result = triage(doc, messages)
+    if result["decision"] != "escalate":
+        logger.info(f"⚡ Triage resolved {vici_id}: {result['decision']} ({result['reason']})")
+        await finish_evaluation(doc, triage_evaluation(result), result)
+        return
+
+    if not os.path.exists(file_path):
+        # The egress finished but the file may not have synced here yet: leave
+        # it to a later pass until the grace period runs out
+        finalized_at = doc.get("recording", {}).get("finalized_at") or doc["_id"].generation_time.replace(tzinfo=None)
+        if datetime.datetime.utcnow() - finalized_at < RECORDING_SYNC_GRACE:
+            logger.info(f"⏳ Recording for {vici_id} not synced yet")
+            return
+        logger.warning(f"Recording not found for {vici_id}")
+        await collection.update_one({"_id": doc["_id"]}, {"$set": {"status": "recording_missing"}})
+        return
+
+    expected_size = doc.get("recording", {}).get("size")
+    if expected_size and os.path.getsize(file_path) < expected_size:
+        logger.info(f"⏳ Recording for {vici_id} not fully synced yet ({os.path.getsize(file_path)}/{expected_size} bytes)")
+        return
+
     try:
         logger.info(f"🧠 Analyzing full call for {vici_id} ({candidate_name})...")
         with open(file_path, "rb") as audio_file:
@@ -69,14 +115,15 @@ async def evaluate_call(doc):
             "}"
         )
 
-        response = openai_client.chat.completions.create(
+        est_tokens = int(os.path.getsize(file_path) * AUDIO_TOKENS_PER_BYTE) + PROMPT_TOKENS
+        response = await scheduler.run(lambda: openai_client.chat.completions.create(
             model="gpt-4o-audio-preview",
             modalities=["text"],
             messages=[{"role": "user", "content": [
                 {"type": "text", "text": prompt},
                 {"type": "input_audio", "input_audio": {"data": audio_data, "format": "mp3"}}
             ]}]
-        )
+        ), est_tokens)
 
         # --- FIX 1: Robust JSON Parsing ---
         raw_eval = response.choices[0].message.content
@@ -87,30 +134,11 @@ async def evaluate_call(doc):
         else:
             raise ValueError(f"No JSON found in response: {raw_eval}")
 
-        # --- FIX 2: Correct variable passing ---
-        sentiment = eval_data.get("sentiment")
-        interest = eval_data.get("interest_level", 0)
-
-        is_hot_lead = interest >= 7 or (sentiment == "positive" and interest >= 5)
-
-        if is_hot_lead:
-            logger.info(f"✨ Hot Lead! Sending {candidate_name} to human agent.")
-            # Pass candidate_name explicitly to the callback
-            await trigger_vicidial_callback(phone_no, vici_id, candidate_name)
-
-        await collection.update_one(
-            {"_id": doc["_id"]},
-            {"$set": {
-                "status": "completed",
-                "ai_summary": eval_data.get("summary"),
-                "ai_key_points": eval_data.get("key_points"),
-                "audio_prosody_evaluation": eval_data,
-                "evaluation_status": "completed",
-                "evaluated_at": datetime.datetime.utcnow()
-            }}
-        )
-        logger.info(f"✅ Full processing complete for {vici_id}")
+        await finish_evaluation(doc, eval_data, result)
 
+    except RetriesExhausted as e:
+        logger.error(f"☠️ Evaluation for {vici_id} dead-lettered: {e}")
+        await dead_letter(db, doc, e)
     except Exception as e:
         logger.error(f"❌ Error during evaluation: {e}")
         await collection.update_one(
@@ -118,36 +146,83 @@ async def evaluate_call(doc):
             {"$set": {"evaluation_status": "failed_error", "error_log": str(e)}}
         )
 
-async def trigger_vicidial_callback(phone, call_id, name):
-    """Sends to Vicidial comments and puts lead in the hopper"""
-    params = {
-        "phone_number": str(phone),
-        "first_name": str(name),
-        "comments": f"CallID: {call_id}"
-    }
-    async with aiohttp.ClientSession() as session:
-        async with session.get(VICIDIAL_API_URL, params=params) as resp:
-            text = await resp.text()
-            logger.info(f"☎️ Vicidial callback triggered: {text}")
+async def finish_evaluation(doc, eval_data, triage_result):
+    vici_id = doc.get("call_id")
+    candidate_name = doc.get("name", "Candidate")
 
-async def main():
-    logger.info("🚀 Evaluator Worker started. Watching for completed calls...")
+    if is_hot_lead(eval_data):
+        logger.info(f"✨ Hot Lead! Sending {candidate_name} to human agent.")
+        # Pass candidate_name explicitly to the callback
+        await callbacks.submit(doc.get("phone_no", "Unknown"), vici_id, candidate_name)
+
+    escalated = triage_result["decision"] == "escalate"
+    await collection.update_one(
+        {"_id": doc["_id"]},
+        {"$set": {
+            "status": "completed",
+            "ai_summary": eval_data.get("summary"),
+            "ai_key_points": eval_data.get("key_points"),
+            # Only audio-model results go here (triage train uses them as labels)
+            **({"audio_prosody_evaluation": eval_data} if escalated else {"triage_evaluation": eval_data}),
+            "triage": triage_result,
+            "evaluation_source": "audio_model" if escalated else "triage",
+            "evaluation_status": "completed",
+            "evaluated_at": datetime.datetime.utcnow()
+        }}
+    )
+    await record_triage(db, triage_result)
+    logger.info(f"✅ Full processing complete for {vici_id}")
+
+async def on_egress_ended(fields):
+    """egress_ended webhook: store the final recording and evaluate the call right away."""
+    doc = await collection.find_one({"egress_id": fields.get("egress_id")}, {"call_id": 1})
+    if not doc:
+        return
+    event = parse_payload(fields)
+    if await record_egress_result(collection, doc["call_id"], event.egress_info):
+        ready = await collection.find_one({"_id": doc["_id"], **EVAL_QUERY}, EVAL_PROJECTION)
+        if ready:
+            start_evaluation(ready)
+
+in_flight = {}  # call_id -> task, so a slow evaluation isn't picked up twice
+
+def start_evaluation(doc):
+    if doc["call_id"] in in_flight:
+        return
+    task = asyncio.create_task(evaluate_call(doc))
+    in_flight[doc["call_id"]] = task
+    task.add_done_callback(lambda _: in_flight.pop(doc["call_id"], None))
+
+async def sweep():
     while True:
-        # Added missing comma in the query dictionary below
-        cursor = collection.find({
-            "status": "yet_to_evaluate",
-            "call_id": {"$exists": True},
-            "ready_for_eval":{"$eq": True},
-            "name": {"$exists": True},
-            "messages.4": {"$exists": True},# This means "has at least 3 messages"
-
-        })
-        
+        cursor = collection.find(EVAL_QUERY, EVAL_PROJECTION)
+
+        # Calls run concurrently; the scheduler paces the model requests.
+        # Enough in flight to keep the adaptive limit saturated, not the whole backlog.
         async for doc in cursor:
-            await evaluate_call(doc)
-        
-        await asyncio.sleep(10)
+            while len(in_flight) >= EVAL_MAX_CONCURRENCY * 2:
+                await asyncio.wait(list(in_flight.values()), return_when=asyncio.FIRST_COMPLETED)
+            start_evaluation(doc)
+
+        logger.info(f"📊 Scheduler: {scheduler.stats}, concurrency limit {scheduler.limiter.limit}")
+        await asyncio.sleep(SWEEP_INTERVAL)
+
+async def main():
+    logger.info("🚀 Evaluator Worker started. Watching for completed calls...")
+    await ensure_callback_indexes(db)
+    await callbacks.start()
+    tasks = [sweep()]
+    if WEBHOOKS_ENABLED:
+        tasks.append(consume("evaluator", {"egress_ended": on_egress_ended}))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await callbacks.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if len(sys.argv) >= 2 and sys.argv[1] == "requeue":
+        # python evaluate.py requeue -> retry everything in the dead-letter collection
+        print(f"Requeued {asyncio.run(requeue_dead_letters(db))} calls")
+    else:
+        asyncio.run(main())
 
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+
+import redis.asyncio as aioredis
+from google.protobuf.json_format import MessageToDict, Parse
+from livekit import api
+
+logger = logging.getLogger("livekit.agents")
+
+# --- LiveKit webhook event bus (Redis stream) ---
+# webhook_receiver.py publishes verified LiveKit webhooks here; the agent
+# worker, evaluator and dashboard consume them instead of polling.
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+STREAM = os.getenv("LIVEKIT_EVENT_STREAM", "livekit:events")
+STREAM_MAXLEN = 100000
+ACTIVE_ROOMS_KEY = "livekit:active_rooms"
+
+# Set LIVEKIT_WEBHOOKS=1 once LiveKit's webhook config points at the receiver
+WEBHOOKS_ENABLED = os.getenv("LIVEKIT_WEBHOOKS") == "1"
+
+EVENTS = {"room_started", "room_finished", "participant_joined", "participant_left", "egress_ended"}
+
+
+def event_fields(event):
+    """Flat, indexable stream fields for a WebhookEvent. The full event is kept as JSON in 'payload'."""
+    fields = {
+        "event": event.event,
+        "id": event.id,
+        "created_at": str(event.created_at),
+        "room": event.room.name or event.egress_info.room_name,
+        "payload": json.dumps(MessageToDict(event, preserving_proto_field_name=True)),
+    }
+    if event.participant.identity:
+        fields["participant_identity"] = event.participant.identity
+        fields["participant_attributes"] = json.dumps(dict(event.participant.attributes))
+    if event.egress_info.egress_id:
+        fields["egress_id"] = event.egress_info.egress_id
+        fields["egress_status"] = api.EgressStatus.Name(event.egress_info.status)
+    return fields
+
+
+def parse_payload(fields):
+    return Parse(fields["payload"], api.WebhookEvent(), ignore_unknown_fields=True)
+
+
+async def publish(redis_client, event):
+    return await redis_client.xadd(STREAM, event_fields(event), maxlen=STREAM_MAXLEN, approximate=True)
+
+
+async def consume(group, handlers, consumer=None, redis_client=None):
+    """
+    Delivers stream events to handlers[event_name](fields) through a consumer group.
+    Each event reaches one consumer per group; it is acked after its handler returns.
+    """
+    redis_client = redis_client or aioredis.from_url(REDIS_URL, decode_responses=True)
+    # Stable name so a restarted process picks up its own unacked events
+    consumer = consumer or os.getenv("EVENT_CONSUMER", socket.gethostname())
+    try:
+        await redis_client.xgroup_create(STREAM, group, id="$", mkstream=True)
+    except aioredis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+    # Start with anything this consumer read but never acked (crash recovery), then new events
+    pending_id = "0"
+    while True:
+        res = await redis_client.xreadgroup(group, consumer, {STREAM: pending_id or ">"}, count=50,
+                                            block=None if pending_id else 0)
+        entries = res[0][1] if res else []
+        if pending_id:
+            if not entries:
+                pending_id = None
+                continue
+            pending_id = entries[-1][0]
+        for entry_id, fields in entries:
+            handler = handlers.get(fields.get("event"))
+            try:
+                if handler:
+                    await handler(fields)
+                await redis_client.xack(STREAM, group, entry_id)
+            except Exception as e:
+                # Left pending; redelivered on the next restart of this consumer
+                logger.error(f"Event handler failed for {fields.get('event')} {fields.get('id')}: {e}")
+
+
+async def tail(last_id="$", redis_client=None):
+    """Yields new events without a consumer group (every reader sees every event). Pass a shared client from servers."""
+    own_client = redis_client is None
+    redis_client = redis_client or aioredis.from_url(REDIS_URL, decode_responses=True)
+    try:
+        while True:
+            res = await redis_client.xread({STREAM: last_id}, count=100, block=15000)
+            for _, entries in res or []:
+                for entry_id, fields in entries:
+                    last_id = entry_id
+                    yield fields
+    finally:
+        if own_client:
+            await redis_client.aclose()
+
+
+def start_consumer_thread(group, handlers):
+    """Runs consume() on its own loop in a daemon thread, for processes without a long-lived loop of their own."""
+    thread = threading.Thread(target=lambda: asyncio.run(consume(group, handlers)), name=f"event-bus-{group}", daemon=True)
+    thread.start()
+    return thread
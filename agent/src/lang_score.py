@@ -0,0 +1,248 @@
+import json
+import re
+import sys
+import time
+from typing import List, Optional
+
+# --- Scoring Config ---
+# Minimums used by the step 6 "evaluate_language" check (see kb.py)
+HINDI_MIN_SCORE = 6
+ENGLISH_MIN_SCORE = 7
+
+# Normal conversational range on a phone line (words per minute)
+MIN_GOOD_WPM = 90
+MAX_GOOD_WPM = 180
+
+# How much speech in one language earns full coverage / vocabulary points.
+# Calibrated on step 6 answers from bilingual candidates, who give each
+# language one or two sentences (15-25 words each); a name or a set phrase
+# in the other language scores well under the minimums.
+TARGET_WORDS = 15
+TARGET_UNIQUE_WORDS = 10
+# Shorter runs are names and loanwords ("Tally ka kaam", "B.Com kiya hai"),
+# not speech in that language: inside a sentence they join it, elsewhere
+# they count for neither language
+MIN_RUN_WORDS = 3
+
+DEVANAGARI_RE = re.compile(r"[ऀ-ॿ]")
+TOKEN_RE = re.compile(r"[ऀ-ॿ]+|[a-zA-Z']+")
+
+# Romanized Hindi as Deepgram writes it (Hinglish). Kept to frequent words
+# that don't collide with common English words; those that do are in
+# AMBIGUOUS_WORDS only.
+HINDI_ROMAN_WORDS = {
+    "hai", "hain", "hoon", "tha", "thi", "mera", "meri", "mere", "mai", "mujhe",
+    "mujhko", "hum", "humne", "maine", "aap", "aapka", "aapki", "tum", "naam", "aur",
+    "ke", "ki", "ka", "ko", "se", "mein", "nahi", "nahin", "haan", "ji", "kya", "kyun",
+    "kaise", "kaha", "kahan", "kab", "kaun", "accha", "acha", "theek", "thik", "bahut",
+    "bohot", "thoda", "abhi", "pehle", "baad", "kaam", "karta", "karti", "karte",
+    "kiya", "kar", "raha", "rahi", "rahe", "rehta", "rehti", "rehte", "gaya", "gayi",
+    "wala", "wali", "bhi", "sirf", "lekin", "kyunki", "agar", "toh", "yeh", "ye",
+    "woh", "wo", "ghar", "padhai", "bolna", "bol", "sakta", "sakti", "sakte", "aata",
+    "aati", "achha", "bilkul", "samajh", "batao", "bataiye", "matlab", "apna", "apni",
+    "hamara", "hamari", "unka", "unki", "kuch", "sab", "dono", "chahiye", "saal",
+    "paas", "liye", "wahan", "yahan", "ek", "teen",
+}
+
+# Words that are valid English but also show up as Hindi particles. They only
+# count as Hindi when the neighbouring tokens are Hindi.
+AMBIGUOUS_WORDS = {"to", "the", "me", "do", "main", "par", "pe", "ha", "hu", "hun", "ya", "jo", "log", "din"}
+
+LANGUAGES = ["hindi", "english", "kannada", "tamil", "telugu", "malayalam", "marathi", "bengali", "gujarati",
+             "punjabi", "urdu", "odia", "assamese"]
+LANGUAGE_SCRIPT_NAMES = {"हिंदी": "hindi", "हिन्दी": "hindi", "अंग्रेजी": "english", "अंग्रेज़ी": "english"}
+LANGUAGE_RE = re.compile(r"\b(" + "|".join(LANGUAGES) + r")\b|" + "|".join(LANGUAGE_SCRIPT_NAMES), re.IGNORECASE)
+
+ENGLISH_FILLERS = {"um", "umm", "uh", "uhh", "hmm", "er", "erm", "ah", "like", "basically", "actually"}
+HINDI_FILLERS = {"matlab", "woh", "wo", "haan", "accha", "acha", "achha", "toh", "हाँ", "मतलब"}
+FILLER_PHRASES = ("you know", "i mean", "kind of", "sort of")
+
+
+def tokenize(text: str) -> List[str]:
+    return [t.lower() for t in TOKEN_RE.findall(text or "")]
+
+
+def tag_languages(tokens: List[str]) -> List[str]:
+    """Labels each token 'hi' or 'en'. Ambiguous words follow their neighbours."""
+    tags = []
+    for tok in tokens:
+        if DEVANAGARI_RE.search(tok):
+            tags.append("hi")
+        elif tok in AMBIGUOUS_WORDS:
+            tags.append(None)
+        elif tok in HINDI_ROMAN_WORDS:
+            tags.append("hi")
+        else:
+            tags.append("en")
+
+    # Resolve ambiguous tokens from the nearest tagged neighbour on either side
+    for i, tag in enumerate(tags):
+        if tag:
+            continue
+        left = next((tags[j] for j in range(i - 1, -1, -1) if tags[j]), None)
+        right = next((tags[j] for j in range(i + 1, len(tags)) if tags[j]), None)
+        tags[i] = "hi" if "hi" in (left, right) else "en"
+    return tags
+
+
+def segment_languages(tokens: List[str], tags: List[str]) -> List[dict]:
+    segments = []
+    for tok, tag in zip(tokens, tags):
+        if segments and segments[-1]["lang"] == tag:
+            segments[-1]["words"] += 1
+            segments[-1]["text"] += f" {tok}"
+        else:
+            segments.append({"lang": tag, "words": 1, "text": tok})
+    return segments
+
+
+def _runs(tags: List[str]) -> List[list]:
+    runs = []
+    for tag in tags:
+        if runs and runs[-1][0] == tag:
+            runs[-1][1] += 1
+        else:
+            runs.append([tag, 1])
+    return runs
+
+
+def absorb_short_runs(tags: List[str]) -> List[str]:
+    """Relabels runs under MIN_RUN_WORDS that sit inside the other language, single words first."""
+    for size in range(1, MIN_RUN_WORDS):
+        runs = _runs(tags)
+        for i in range(1, len(runs) - 1):
+            if runs[i][1] == size and runs[i - 1][0] == runs[i + 1][0] != runs[i][0]:
+                runs[i][0] = runs[i - 1][0]
+        tags = [tag for tag, n in runs for _ in range(n)]
+    return tags
+
+
+def speaking_rate(tokens: List[str], words: Optional[List[dict]] = None, duration: Optional[float] = None) -> Optional[float]:
+    """Words per minute, from STT word timings when present, else the utterance duration."""
+    if words:
+        spoken = [w for w in words if w.get("end") is not None and w.get("start") is not None]
+        if spoken:
+            duration = max(w["end"] for w in spoken) - min(w["start"] for w in spoken)
+            if duration > 0:
+                return len(spoken) / duration * 60
+    if duration and duration > 0:
+        return len(tokens) / duration * 60
+    return None
+
+
+def filler_ratio(text: str, tokens: List[str]) -> float:
+    if not tokens:
+        return 0.0
+    lowered = (text or "").lower()
+    count = sum(1 for t in tokens if t in ENGLISH_FILLERS or t in HINDI_FILLERS)
+    count += sum(lowered.count(p) for p in FILLER_PHRASES)
+    return min(count / len(tokens), 1.0)
+
+
+def _language_score(lang_tokens: List[str], rate_factor: float, fillers: float) -> float:
+    if not lang_tokens:
+        return 0.0
+    content = [t for t in lang_tokens if t not in ENGLISH_FILLERS and t not in HINDI_FILLERS]
+    coverage = min(len(content) / TARGET_WORDS, 1.0) * 4
+    vocabulary = min(len(set(content)) / TARGET_UNIQUE_WORDS, 1.0) * 3
+    fluency = 3 * rate_factor * (1 - min(fillers * 3, 1.0))
+    return round(coverage + vocabulary + fluency, 1)
+
+
+def score_transcript(text: str, words: Optional[List[dict]] = None, duration: Optional[float] = None) -> dict:
+    """
+    Scores Hindi and English proficiency (0-10) for a candidate answer.
+    `words` are STT word timings ({"word", "start", "end"} in seconds).
+    """
+    tokens = tokenize(text)
+    tags = tag_languages(tokens)
+    wpm = speaking_rate(tokens, words, duration)
+    fillers = filler_ratio(text, tokens)
+
+    # Unknown rate (no timings) costs nothing; too slow or too fast loses fluency points
+    if wpm is None or MIN_GOOD_WPM <= wpm <= MAX_GOOD_WPM:
+        rate_factor = 1.0
+    elif wpm < MIN_GOOD_WPM:
+        rate_factor = max(wpm / MIN_GOOD_WPM, 0.0)
+    else:
+        rate_factor = max(MAX_GOOD_WPM / wpm, 0.0)
+
+    hindi_tokens = [t for t, tag in zip(tokens, tags) if tag == "hi"]
+    segments = segment_languages(tokens, absorb_short_runs(tags))
+    spoken = {"hi": [], "en": []}
+    for seg in segments:
+        if seg["words"] >= MIN_RUN_WORDS:
+            spoken[seg["lang"]].extend(seg["text"].split())
+
+    return {
+        "hindi_score": _language_score(spoken["hi"], rate_factor, fillers),
+        "english_score": _language_score(spoken["en"], rate_factor, fillers),
+        "hindi_ratio": round(len(hindi_tokens) / len(tokens), 3) if tokens else 0.0,
+        "words_per_minute": round(wpm, 1) if wpm is not None else None,
+        "filler_ratio": round(fillers, 3),
+        "type_token_ratio": round(len(set(tokens)) / len(tokens), 3) if tokens else 0.0,
+        "word_count": len(tokens),
+        "segments": segments,
+    }
+
+
+def named_languages(text: str) -> List[str]:
+    found = []
+    for m in LANGUAGE_RE.finditer(text or ""):
+        lang = m.group(1).lower() if m.group(1) else LANGUAGE_SCRIPT_NAMES[m.group(0)]
+        if lang not in found:
+            found.append(lang)
+    return found
+
+
+def lacks_hindi(text: str) -> bool:
+    """
+    Step 5 ("What are all languages you can speak?") check_hindi logic. Fails only
+    on an answer that lists languages without Hindi, not on "sorry, can you repeat?".
+    """
+    languages = named_languages(text)
+    return bool(languages) and "hindi" not in languages
+
+
+def passes_language_check(scores: dict) -> bool:
+    return scores["hindi_score"] >= HINDI_MIN_SCORE and scores["english_score"] >= ENGLISH_MIN_SCORE
+
+
+# --- Benchmark on saved transcripts ---
+# Usage: python lang_score.py transcripts.json
+# The file is a list of conversation_history documents (mongoexport --jsonArray)
+# or plain strings. Only the candidate ("user") turns are scored.
+def _load_answers(path):
+    with open(path) as f:
+        docs = json.load(f)
+    answers = []
+    for doc in docs:
+        if isinstance(doc, str):
+            answers.append((None, doc))
+            continue
+        user_text = " ".join(m.get("text", "") for m in doc.get("messages", []) if m.get("role") == "user")
+        answers.append((doc.get("call_id"), user_text))
+    return answers
+
+
+def benchmark(path):
+    answers = _load_answers(path)
+    timings = []
+    for call_id, text in answers:
+        start = time.perf_counter()
+        scores = score_transcript(text)
+        timings.append((time.perf_counter() - start) * 1000)
+        print(f"{call_id or '-'}: hindi={scores['hindi_score']} english={scores['english_score']} "
+              f"words={scores['word_count']} fillers={scores['filler_ratio']} pass={passes_language_check(scores)}")
+
+    if timings:
+        timings.sort()
+        p95 = timings[min(int(len(timings) * 0.95), len(timings) - 1)]
+        print(f"\nScored {len(timings)} transcripts: mean={sum(timings) / len(timings):.3f}ms p95={p95:.3f}ms max={timings[-1]:.3f}ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python lang_score.py <transcripts.json>")
+        sys.exit(1)
+    benchmark(sys.argv[1])
@@ -0,0 +1,472 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+from aiohttp import web
+from livekit.agents.llm import ChatMessage
+
+# Point the agent at the local receive-api stand-in before it is imported
+LOADTEST_API_PORT = int(os.getenv("LOADTEST_API_PORT", "9101"))
+os.environ.setdefault("RECEIVE_API_URL", f"http://127.0.0.1:{LOADTEST_API_PORT}")
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import agent_n
+from kb import recruitment_steps, turn_profiles
+from speculation import report as speculation_report
+from worker_load import read_rss_mb
+
+# Synthetic concurrent-call load test for agent_n.entrypoint.
+#
+#   python loadtest.py --levels 1,5,10,20,50,100 --time-scale 0.1 --out loadtest.json
+#
+# Each call runs in its own thread + event loop, like JobExecutorType.THREAD.
+# STT/LLM/TTS, Redis, Mongo, the LiveKit API and receive-api are replaced by
+# local fakes; processing latencies come from the configured distributions.
+
+DEFAULT_SCRIPT = [
+    "Yes, speaking.",
+    "Yes, I am looking for a job right now.",
+    "Sure, please tell me more.",
+    "Yes, HSR Layout is fine, I can commute.",
+    "I can speak Hindi, English and Kannada.",
+    "Mera naam Rahul hai, main Bangalore mein rehta hoon aur maine B.Com kiya hai. "
+    "My name is Rahul, I completed my bachelor of commerce and I have two years of experience in accounting with Tally.",
+    "That sounds good, I have used Tally before.",
+    "Yes, I am comfortable with that.",
+    "Yes, the training works for me.",
+    "Okay, that is fine.",
+    "No questions, that is clear.",
+    "Yes, I am available tomorrow.",
+    "Sure, I will share my resume.",
+    "Sounds good, thank you.",
+]
+
+
+class Latency:
+    """Gaussian latency in seconds, parsed from 'mean:stddev'."""
+
+    def __init__(self, spec):
+        mean, _, std = spec.partition(":")
+        self.mean, self.std = float(mean), float(std or 0)
+
+    def sample(self):
+        return max(random.gauss(self.mean, self.std), 0.0)
+
+
+# --- Fake AI plugins ---
+class FakeSTT:
+    def __init__(self, latency):
+        self.latency = latency
+
+
+class FakeLLM:
+    def __init__(self, latency):
+        self.latency = latency
+
+
+class FakeTTS:
+    def __init__(self, latency):
+        self.latency = latency
+
+
+class FakeSession:
+    """Stands in for AgentSession: replies take LLM + TTS time, the candidate answers from a script."""
+
+    def __init__(self, call, stt, llm, tts):
+        self.call, self.stt, self.llm, self.tts = call, stt, llm, tts
+        self.handlers = {}
+        self.endpointing = (0.5, 6.0)
+
+    def update_options(self, *, min_endpointing_delay=None, max_endpointing_delay=None, turn_detection=None):
+        self.endpointing = (min_endpointing_delay, max_endpointing_delay)
+
+    def on(self, event, callback=None):
+        def register(fn):
+            self.handlers.setdefault(event, []).append(fn)
+            return fn
+        return register(callback) if callback else register
+
+    def emit(self, event, ev):
+        for fn in self.handlers.get(event, []):
+            fn(ev)
+
+    async def start(self, agent=None, room=None):
+        self.agent = agent
+
+    async def _add_to_context(self, role, text):
+        chat_ctx = self.agent.chat_ctx.copy()
+        chat_ctx.add_message(role=role, content=text)
+        await self.agent.update_chat_ctx(chat_ctx)
+
+    async def user_turn(self, text):
+        """What the SDK does at the end of a user turn: the agent's hook, the user message, the reply."""
+        turn_ctx = self.agent.chat_ctx.copy()
+        before = len(turn_ctx.items)
+        await self.agent.on_user_turn_completed(turn_ctx, new_message=ChatMessage(role="user", content=[text]))
+        await self._add_to_context("user", text)
+        self.emit("conversation_item_added", SimpleNamespace(item=SimpleNamespace(role="user", text_content=text)))
+        added = [item.text_content for item in turn_ctx.items[before:] if item.type == "message" and item.role == "system"]
+        await self.generate_reply(instructions=added[-1] if added else "")
+
+    async def generate_reply(self, instructions=""):
+        await asyncio.sleep(self.llm.latency.sample() + self.tts.latency.sample())
+        if self.call.speech_ended_at is not None:
+            self.call.turn_latencies.append(time.perf_counter() - self.call.speech_ended_at)
+            self.call.speech_ended_at = None
+
+        text = instructions.split(":", 1)[-1].strip()
+        await self._add_to_context("assistant", text)
+        self.emit("conversation_item_added", SimpleNamespace(item=SimpleNamespace(role="assistant", text_content=text)))
+        self.emit("agent_state_changed", SimpleNamespace(old_state="thinking", new_state="speaking"))
+        await asyncio.sleep(len(text.split()) / 2.5 * self.call.time_scale)
+        self.emit("agent_state_changed", SimpleNamespace(old_state="speaking", new_state="listening"))
+        self.call.schedule_answer()
+
+
+# --- Fake LiveKit room / job / API ---
+class FakeRoom:
+    def __init__(self, name):
+        self.name = name
+        self.metadata = ""
+        self.handlers = {}
+
+    def on(self, event, callback=None):
+        def register(fn):
+            self.handlers.setdefault(event, []).append(fn)
+            return fn
+        return register(callback) if callback else register
+
+    def emit(self, event, *args):
+        for fn in self.handlers.get(event, []):
+            fn(*args)
+
+    async def disconnect(self):
+        pass
+
+
+class FakeJobContext:
+    def __init__(self, call_no):
+        self.job = SimpleNamespace(id=f"loadtest-job-{call_no}")
+        self.proc = SimpleNamespace(userdata={})
+        self.room = FakeRoom(f"loadtest-room-{call_no}")
+        self.participant = SimpleNamespace(identity=f"sip-{call_no}", attributes={"vici_id": f"LT{call_no:06d}"})
+        self.shutdown_callbacks = []
+
+    async def connect(self):
+        pass
+
+    async def wait_for_participant(self):
+        return self.participant
+
+    def add_shutdown_callback(self, cb):
+        self.shutdown_callbacks.append(cb)
+
+    def shutdown(self, reason=""):
+        pass
+
+
+class FakeLiveKitAPI:
+    def __init__(self, *args, **kwargs):
+        self.room = SimpleNamespace(list_rooms=self._list_rooms, delete_room=self._noop)
+        self.egress = SimpleNamespace(start_room_composite_egress=self._start_egress, list_egress=self._list_egress)
+        self.sip = SimpleNamespace(transfer_sip_participant=self._noop, create_sip_participant=self._noop)
+
+    async def _list_rooms(self, req):
+        return SimpleNamespace(rooms=[])
+
+    async def _start_egress(self, req):
+        return SimpleNamespace(egress_id=f"EG_{id(req)}")
+
+    async def _list_egress(self, req):
+        file_info = SimpleNamespace(size=480000, duration=60 * 10**9, location="", filename=f"/out/{req.egress_id}.mp3")
+        return SimpleNamespace(items=[SimpleNamespace(status=agent_n.api.EgressStatus.EGRESS_COMPLETE,
+                                                      file_results=[file_info], error="")])
+
+    async def _noop(self, *args, **kwargs):
+        return None
+
+    async def aclose(self):
+        pass
+
+
+class FakeApiModule:
+    """The real livekit.api with LiveKitAPI swapped for the fake."""
+
+    def __init__(self, real):
+        self.real = real
+        self.LiveKitAPI = FakeLiveKitAPI
+
+    def __getattr__(self, name):
+        return getattr(self.real, name)
+
+
+# --- Redis / Mongo stand-ins ---
+class FakeRedis:
+    def __init__(self, steps, profiles):
+        self.data = {f"step:{k}": dict(v) for k, v in steps.items()}
+        self.data.update({f"turn_profile:{k}": dict(v) for k, v in profiles.items()})
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def get(self, key):
+        return None
+
+    def xadd(self, stream, fields, **kwargs):
+        return "0-0"
+
+
+class FakeCollection:
+    def __init__(self, database=None):
+        self.database = database
+        self.docs = []
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _matches(doc, query):
+        for key, cond in query.items():
+            value = doc.get(key)
+            if isinstance(cond, dict):
+                if "$gte" in cond and (value is None or value < cond["$gte"]):
+                    return False
+                if "$exists" in cond and (key in doc) != cond["$exists"]:
+                    return False
+            elif value != cond:
+                return False
+        return True
+
+    async def find_one(self, query, projection=None, sort=None):
+        with self.lock:
+            return next((dict(d) for d in self.docs if self._matches(d, query)), None)
+
+    async def update_one(self, query, update, upsert=False):
+        with self.lock:
+            doc = next((d for d in self.docs if self._matches(d, query)), None)
+            if doc is None:
+                if not upsert:
+                    return
+                doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+                doc.update(update.get("$setOnInsert", {}))
+                self.docs.append(doc)
+            doc.update(update.get("$set", {}))
+            for key, value in update.get("$push", {}).items():
+                doc.setdefault(key, []).append(value)
+            for key, value in update.get("$inc", {}).items():
+                doc[key] = doc.get(key, 0) + value
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.conversation_history = FakeCollection(self)
+        self.conversation_turns = FakeCollection(self)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+FAKE_DB = FakeDatabase()
+
+
+class FakeMongoClient:
+    def __init__(self, *args, **kwargs):
+        self.asterisk = FAKE_DB
+
+
+# --- receive-api stand-in ---
+async def start_receive_api():
+    async def get_data(request):
+        uid = request.match_info["unique_id"]
+        return web.json_response({"unique_id": uid, "field_1": "Load Test", "field_2": "lead_0", "field_3": f"9{uid[-9:]}"})
+
+    async def clear_data(request):
+        return web.json_response({"status": "deleted"})
+
+    async def liveagents(request):
+        return web.json_response({"user": None, "ext": "No agents available"})
+
+    app = web.Application()
+    app.router.add_get("/get-data/{unique_id}", get_data)
+    app.router.add_delete("/clear-data/{unique_id}", clear_data)
+    app.router.add_post("/liveagents/", liveagents)
+    app.router.add_post("/liveagents", liveagents)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", LOADTEST_API_PORT).start()
+    return runner
+
+
+# --- One synthetic call ---
+class SyntheticCall:
+    def __init__(self, call_no, args):
+        self.call_no = call_no
+        self.script = list(args.script)
+        self.stt_latency = args.stt
+        self.time_scale = args.time_scale
+        self.ctx = FakeJobContext(call_no)
+        self.session = None
+        self.turn_latencies = []
+        self.loop_lags = []
+        self.speech_ended_at = None
+        self.error = None
+        self.done = None
+
+    def schedule_answer(self):
+        asyncio.get_running_loop().create_task(self._answer())
+
+    async def _answer(self):
+        if not self.script:
+            self.ctx.room.emit("participant_disconnected", self.ctx.participant)
+            self.done.set()
+            return
+        text = self.script.pop(0)
+        self.session.emit("user_state_changed", SimpleNamespace(old_state="listening", new_state="speaking"))
+        await asyncio.sleep(len(text.split()) / 2.5 * self.time_scale)
+        self.session.emit("user_state_changed", SimpleNamespace(old_state="speaking", new_state="listening"))
+        self.speech_ended_at = time.perf_counter()
+        # The last interim result lands as speech ends, the final one after the STT delay
+        self.session.emit("user_input_transcribed", SimpleNamespace(transcript=text, is_final=False))
+        await asyncio.sleep(self.stt_latency.sample())
+        self.session.emit("user_input_transcribed", SimpleNamespace(transcript=text, is_final=True))
+        await self.session.user_turn(text)
+
+    async def _probe_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(0.05)
+            self.loop_lags.append((loop.time() - start - 0.05) * 1000)
+
+    async def run(self, timeout):
+        self.done = asyncio.Event()
+        probe = asyncio.create_task(self._probe_lag())
+        try:
+            await asyncio.wait_for(agent_n.entrypoint(self.ctx), timeout)
+            await asyncio.wait_for(self.done.wait(), timeout)
+            for cb in self.ctx.shutdown_callbacks:
+                await cb()
+        except Exception as e:
+            self.error = repr(e)
+        finally:
+            probe.cancel()
+            # Let shielded cleanup tasks finish the way the job would
+            pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            if pending:
+                await asyncio.wait(pending, timeout=10)
+
+
+# Each call thread records its SyntheticCall here so make_session can find it
+current_call = threading.local()
+
+
+def install_fakes(args):
+    def make_session(**kwargs):
+        call = current_call.value
+        call.session = FakeSession(call, kwargs.get("stt"), kwargs.get("llm"), kwargs.get("tts"))
+        return call.session
+
+    agent_n.AgentSession = make_session
+    agent_n.silero = SimpleNamespace(VAD=SimpleNamespace(load=lambda **kw: None))
+    agent_n.deepgram = SimpleNamespace(STT=lambda **kw: FakeSTT(args.stt))
+    agent_n.openai = SimpleNamespace(LLM=lambda **kw: FakeLLM(args.llm))
+    agent_n.cartesia = SimpleNamespace(TTS=lambda **kw: FakeTTS(args.tts))
+    agent_n.api = FakeApiModule(agent_n.api)
+    agent_n.AsyncIOMotorClient = FakeMongoClient
+    agent_n.r = FakeRedis(recruitment_steps, turn_profiles)
+
+
+def run_call_thread(call, timeout):
+    current_call.value = call
+    asyncio.run(call.run(timeout))
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(int(len(values) * pct / 100), len(values) - 1)], 2)
+
+
+async def run_level(n, args):
+    calls = [SyntheticCall(i, args) for i in range(n)]
+    rss_before = read_rss_mb()
+    peak_rss = rss_before
+
+    threads = [threading.Thread(target=run_call_thread, args=(c, args.call_timeout), daemon=True) for c in calls]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    while any(t.is_alive() for t in threads):
+        peak_rss = max(peak_rss, read_rss_mb())
+        await asyncio.sleep(0.2)
+    elapsed = time.perf_counter() - start
+
+    turns = [l * 1000 for c in calls for l in c.turn_latencies]
+    lags = [l for c in calls for l in c.loop_lags]
+    return {
+        "concurrency": n,
+        "elapsed_s": round(elapsed, 2),
+        "turns": len(turns),
+        "turn_p50_ms": percentile(turns, 50),
+        "turn_p95_ms": percentile(turns, 95),
+        "turn_p99_ms": percentile(turns, 99),
+        "loop_lag_p95_ms": percentile(lags, 95),
+        "loop_lag_max_ms": round(max(lags), 2) if lags else None,
+        "mem_per_call_mb": round((peak_rss - rss_before) / n, 2),
+        "failures": sum(1 for c in calls if c.error),
+        "errors": sorted({c.error for c in calls if c.error})[:5],
+    }
+
+
+async def main(args):
+    install_fakes(args)
+    runner = await start_receive_api()
+    results = []
+    try:
+        print(f"{'calls':>6} {'turns':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'lag95':>8} {'MB/call':>8} {'fail':>5}")
+        for n in args.levels:
+            res = await run_level(n, args)
+            results.append(res)
+            print(f"{n:>6} {res['turns']:>6} {res['turn_p50_ms']!s:>8} {res['turn_p95_ms']!s:>8} {res['turn_p99_ms']!s:>8} "
+                  f"{res['loop_lag_p95_ms']!s:>8} {res['mem_per_call_mb']:>8} {res['failures']:>5}")
+    finally:
+        await runner.cleanup()
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"ts": time.time(), "config": vars(args) | {"stt": args.stt.__dict__, "llm": args.llm.__dict__,
+                                                                   "tts": args.tts.__dict__}, "levels": results,
+                       "speculative_reply": speculation_report()}, f, indent=2, default=str)
+        print(f"Results written to {args.out}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Concurrent-call load test for the agent worker")
+    parser.add_argument("--levels", default="1,5,10,20,50,100", help="Comma separated concurrency levels")
+    parser.add_argument("--stt", default="0.25:0.05", type=Latency, help="STT final-transcript latency mean:std (s)")
+    parser.add_argument("--llm", default="0.45:0.15", type=Latency, help="LLM time-to-first-token mean:std (s)")
+    parser.add_argument("--tts", default="0.20:0.05", type=Latency, help="TTS time-to-first-byte mean:std (s)")
+    parser.add_argument("--time-scale", type=float, default=0.1, help="Multiplier on speaking time (1.0 = real time)")
+    parser.add_argument("--call-timeout", type=float, default=300)
+    parser.add_argument("--script", help="JSON list of candidate utterances")
+    parser.add_argument("--out", help="Write results JSON here")
+    args = parser.parse_args()
+    args.levels = [int(x) for x in args.levels.split(",") if x]
+    if args.script:
+        with open(args.script) as f:
+            args.script = json.load(f)
+    else:
+        args.script = DEFAULT_SCRIPT
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,143 @@
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+# --- Logging pipeline ---
+# One JSON line per record, written by a background thread:
+#
+#   logger.x() -> CallContextFilter -> DebugSampler -> DroppingQueueHandler --queue--> QueueListener -> JSON -> stdout / AGENT_LOG_FILE
+#
+# The caller only builds the record and does put_nowait. Formatting and I/O
+# happen on the listener thread, and a full queue drops records rather than
+# stalling the audio loop. setup_logging() also removes every other root
+# handler, so the plain-text + JSON duplicates disappear.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.getenv("AGENT_LOG_FILE")  # e.g. data/logs/agent.log; stdout when unset
+LOG_QUEUE_SIZE = 10000
+# DEBUG records: at most this many per call site per minute, then sampled
+DEBUG_MAX_PER_MINUTE = int(os.getenv("LOG_DEBUG_PER_MINUTE", "30"))
+DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE", "0.1"))
+
+# Attributes every LogRecord has; anything else came in through extra=
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "call"}
+
+# One mutable dict per call, shared by every task the job spawns, so a step
+# change made in one task shows up in logs from the others
+_call_context = contextvars.ContextVar("call_log_context", default=None)
+
+
+def new_call_context(**fields):
+    """Call at the top of a job: later tasks inherit this dict."""
+    _call_context.set(dict(fields))
+
+
+def bind_call(**fields):
+    ctx = _call_context.get()
+    if ctx is None:
+        ctx = {}
+        _call_context.set(ctx)
+    ctx.update(fields)
+
+
+class CallContextFilter(logging.Filter):
+    def filter(self, record):
+        ctx = _call_context.get()
+        record.call = dict(ctx) if ctx else None
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Rate limit per call site, then sample. INFO and above always pass."""
+
+    def __init__(self):
+        super().__init__()
+        self.windows = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.INFO:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= 60:
+            window = self.windows[key] = [now, 0]
+        window[1] += 1
+        if window[1] > DEBUG_MAX_PER_MINUTE:
+            return False
+        return window[1] == 1 or random.random() < DEBUG_SAMPLE_RATE
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve %-args now (they may be mutated later); the JSON is built on the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "call", None):
+            entry.update(record.call)
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_queue_handler = None
+_listener = None
+
+
+def setup_logging(level=LOG_LEVEL):
+    """Idempotent. Safe to call again after a framework added its own handlers: they are removed."""
+    global _queue_handler, _listener
+    root = logging.getLogger()
+    if _queue_handler is None:
+        target = logging.handlers.WatchedFileHandler(LOG_FILE) if LOG_FILE else logging.StreamHandler(sys.stdout)
+        target.setFormatter(JsonFormatter())
+        _queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _queue_handler.addFilter(CallContextFilter())
+        _queue_handler.addFilter(DebugSampler())
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, target, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+    for handler in list(root.handlers):
+        if handler is not _queue_handler:
+            root.removeHandler(handler)
+    if _queue_handler not in root.handlers:
+        root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+
+def dropped_records():
+    return _queue_handler.dropped if _queue_handler else 0
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+logger = logging.getLogger("livekit.agents")
+
+# --- Event-loop blocking detector (opt-in: LOOP_DEBUG=1) ---
+# Each watched job loop schedules a heartbeat every HEARTBEAT_INTERVAL. A
+# watchdog thread checks the heartbeats; when one is late by more than
+# LOOP_BLOCK_THRESHOLD_MS the loop is stuck in a callback or coroutine step,
+# and the watchdog grabs that thread's stack *while it is still blocking*.
+# When the heartbeat resumes, the stall's duration is added to its call site
+# (the innermost frame in our own code, e.g. "src/agent_n.py:66 recruitment_node").
+# The report is served by the worker metrics endpoint (worker_load.py).
+LOOP_DEBUG = os.getenv("LOOP_DEBUG") == "1"
+BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+HEARTBEAT_INTERVAL = 0.02
+POLL_INTERVAL = 0.01
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAX_SITES = 200
+
+
+class WatchedLoop:
+    def __init__(self, job_id, loop):
+        self.job_id = job_id
+        self.loop = loop
+        self.thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.lag_ms = deque(maxlen=500)
+        self.stall = None
+        self.handle = None
+
+
+def call_site(stack):
+    """Innermost frame in our code (falls back to the innermost frame), plus where it was actually stuck."""
+    ours = [f for f in stack if f.filename.startswith(PROJECT_DIR)]
+    site = (ours or stack)[-1]
+    inner = stack[-1]
+    return (f"{os.path.relpath(site.filename, PROJECT_DIR)}:{site.lineno} {site.name}",
+            f"{os.path.basename(inner.filename)}:{inner.lineno} {inner.name}")
+
+
+class LoopWatchdog:
+    def __init__(self, threshold_ms=BLOCK_THRESHOLD_MS):
+        self.threshold = threshold_ms / 1000
+        self.loops = {}
+        self.sites = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    # --- Called from the job's loop ---
+    def watch(self, job_id):
+        wl = WatchedLoop(job_id, asyncio.get_running_loop())
+        with self.lock:
+            self.loops[job_id] = wl
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="loop-watchdog", daemon=True)
+                self.thread.start()
+        wl.handle = wl.loop.call_later(HEARTBEAT_INTERVAL, self._beat, wl)
+        return wl
+
+    def unwatch(self, job_id):
+        with self.lock:
+            wl = self.loops.pop(job_id, None)
+        if wl and wl.handle:
+            wl.handle.cancel()
+
+    def _beat(self, wl):
+        now = time.monotonic()
+        with self.lock:
+            late = now - wl.last_beat - HEARTBEAT_INTERVAL
+            wl.lag_ms.append(max(late, 0.0) * 1000)
+            if wl.stall:
+                self._record(wl, late * 1000)
+            wl.last_beat = now
+        wl.handle = wl.loop.call_later(HEARTBEAT_INTERVAL, self._beat, wl)
+
+    # --- Watchdog thread ---
+    def _run(self):
+        while True:
+            time.sleep(POLL_INTERVAL)
+            now = time.monotonic()
+            with self.lock:
+                stuck = [wl for wl in self.loops.values()
+                         if wl.stall is None and now - wl.last_beat - HEARTBEAT_INTERVAL > self.threshold]
+                frames = sys._current_frames() if stuck else {}
+                for wl in stuck:
+                    frame = frames.get(wl.thread_id)
+                    if frame is None:
+                        continue
+                    stack = traceback.extract_stack(frame)
+                    site, blocked_in = call_site(stack)
+                    wl.stall = {"site": site, "blocked_in": blocked_in, "stack": traceback.format_list(stack[-15:])}
+
+    def _record(self, wl, blocked_ms):
+        stall, wl.stall = wl.stall, None
+        logger.warning(f"🧱 Event loop blocked {blocked_ms:.0f}ms in job {wl.job_id} at {stall['site']} ({stall['blocked_in']})")
+        entry = self.sites.get(stall["site"])
+        if entry is None:
+            if len(self.sites) >= MAX_SITES:
+                return
+            entry = self.sites[stall["site"]] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+        entry["count"] += 1
+        entry["total_ms"] += blocked_ms
+        entry["last_job"] = wl.job_id
+        entry["blocked_in"] = stall["blocked_in"]
+        if blocked_ms >= entry["max_ms"]:
+            entry["max_ms"] = blocked_ms
+            entry["stack"] = stall["stack"]
+
+    def report(self, top=20):
+        with self.lock:
+            lags = sorted(l for wl in self.loops.values() for l in wl.lag_ms)
+            sites = sorted(self.sites.items(), key=lambda kv: kv[1]["total_ms"], reverse=True)[:top]
+            watched = len(self.loops)
+
+        def pct(p):
+            return round(lags[min(int(len(lags) * p), len(lags) - 1)], 2) if lags else 0.0
+
+        return {
+            "enabled": LOOP_DEBUG,
+            "threshold_ms": self.threshold * 1000,
+            "watched_loops": watched,
+            "lag_ms": {"p50": pct(0.5), "p99": pct(0.99), "max": round(lags[-1], 2) if lags else 0.0},
+            "blocking_sites": [{"site": site, **{k: round(v, 1) if isinstance(v, float) else v for k, v in s.items()}}
+                               for site, s in sites],
+        }
+
+
+watchdog = LoopWatchdog()
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger("livekit.agents")
+
+# --- Speculative next reply (opt-in: SPECULATIVE_REPLY=1) ---
+# While the candidate is still talking, interim transcripts start planning the
+# agent's next reply: the step lookup, language check and graph run that the
+# agent's on_user_turn_completed would otherwise do. The first interim of each
+# step also prewarms the LLM and TTS connections. When the user turn completes
+# the plan is used if it is still valid (same step,
+# and the same words when the plan depended on them). Otherwise it is
+# discarded and the reply is planned from scratch.
+SPECULATIVE_REPLY = os.getenv("SPECULATIVE_REPLY") == "1"
+WORD_RE = re.compile(r"\w+")
+
+# Across every call in this worker (THREAD executor: one process, many loops)
+_lock = threading.Lock()
+_stats = {"started": 0, "hits": 0, "misses": 0, "no_speculation": 0, "warmups": 0}
+
+
+def _count(key):
+    with _lock:
+        _stats[key] += 1
+
+
+def report():
+    with _lock:
+        stats = dict(_stats)
+    decided = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / decided, 3) if decided else None
+    stats["enabled"] = SPECULATIVE_REPLY
+    return stats
+
+
+def normalize(text):
+    return " ".join(WORD_RE.findall((text or "").lower()))
+
+
+class Speculator:
+    """
+    Per call. plan_fn(text) must be side-effect free and return a dict with
+    "depends_on_text"; key_fn() identifies the conversation state it reads.
+    """
+
+    def __init__(self, plan_fn, key_fn, warm=()):
+        self.plan_fn = plan_fn
+        self.key_fn = key_fn
+        self.warm = warm
+        self.task = None
+        self.key = None
+        self.text = None
+        self.warmed_key = None
+        self.hits = 0
+        self.misses = 0
+
+    def on_interim(self, transcript):
+        text = normalize(transcript)
+        if not text:
+            return
+        key = self.key_fn()
+        if self.task and self.key == key and self.text == text:
+            return
+        self.cancel()
+        self.key, self.text = key, text
+        self.task = asyncio.create_task(self.plan_fn(transcript))
+        _count("started")
+        if self.warmed_key != key:
+            self.warmed_key = key
+            self._warm_up()
+
+    def _warm_up(self):
+        for component in self.warm:
+            if hasattr(component, "prewarm"):
+                try:
+                    component.prewarm()
+                except Exception as e:
+                    logger.debug("Prewarm of %s failed: %s", type(component).__name__, e)
+        _count("warmups")
+
+    async def take(self, transcript):
+        """The speculative plan for this final transcript, or None (caller plans it itself)."""
+        task, self.task = self.task, None
+        if task is None:
+            _count("no_speculation")
+            return None
+        if self.key != self.key_fn():
+            return self._miss(task, "state moved on")
+        try:
+            plan = await task
+        except Exception as e:
+            return self._miss(task, f"plan failed: {e}")
+        if plan["depends_on_text"] and self.text != normalize(transcript):
+            return self._miss(task, "final transcript differs")
+        self.hits += 1
+        _count("hits")
+        return plan
+
+    def _miss(self, task, reason):
+        task.cancel()
+        self.misses += 1
+        _count("misses")
+        logger.debug("Speculative reply discarded: %s", reason)
+        return None
+
+    def cancel(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
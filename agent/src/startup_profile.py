@@ -0,0 +1,89 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+# --- Worker startup profile ---
+#   python startup_profile.py                 # import cost of agent_n, by module
+#   python startup_profile.py --prewarm       # + time each prewarm step
+#   python startup_profile.py --module evaluate --top 40
+#
+# Imports are measured in a fresh interpreter with -X importtime, so the
+# numbers match a cold worker start rather than this (already warm) process.
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_profile(module):
+    """[(package, self_us, cumulative_us, depth)] in import order, plus total wall time."""
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_RE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    if proc.returncode != 0:
+        print(proc.stderr.splitlines()[-1] if proc.stderr else "import failed")
+    return subtree(rows, module), wall
+
+
+def subtree(rows, module):
+    """Only what importing `module` pulled in (importtime lists children before their parent)."""
+    for i, row in enumerate(rows):
+        if row[0] == module and row[3] == 0:
+            start = i
+            while start > 0 and rows[start - 1][3] > 0:
+                start -= 1
+            return rows[start:i + 1]
+    return rows
+
+
+def by_top_level(rows):
+    """Self time rolled up per top-level package (livekit, langgraph, motor...)."""
+    totals = {}
+    for name, self_us, _, _ in rows:
+        top = name.split(".")[0]
+        totals[top] = totals.get(top, 0) + self_us
+    return sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def print_imports(module, top):
+    rows, wall = import_profile(module)
+    print(f"import {module}: {wall * 1000:.0f} ms wall (fresh interpreter)\n")
+
+    print(f"{'package':<30} {'self ms':>9}")
+    for name, us in by_top_level(rows)[:top]:
+        print(f"{name:<30} {us / 1000:>9.1f}")
+
+    # Direct imports of the module, cumulative: what each line at the top of the file costs
+    direct = [r for r in rows if r[3] == 1]
+    print(f"\n{'direct import':<45} {'cumulative ms':>14}")
+    for name, _, cum_us, _ in sorted(direct, key=lambda r: r[2], reverse=True)[:top]:
+        print(f"{name:<45} {cum_us / 1000:>14.1f}")
+
+
+def print_prewarm():
+    import agent_n
+
+    proc = SimpleNamespace(userdata={})
+    started = time.perf_counter()
+    agent_n.prewarm(proc)
+    print(f"\nprewarm: {(time.perf_counter() - started) * 1000:.0f} ms")
+    for step, ms in proc.userdata.get("startup", {}).items():
+        print(f"  {step:<28} {ms:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import and initialization cost of the agent worker")
+    parser.add_argument("--module", default="agent_n")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--prewarm", action="store_true", help="also run and time agent_n.prewarm")
+    args = parser.parse_args()
+    print_imports(args.module, args.top)
+    if args.prewarm:
+        print_prewarm()
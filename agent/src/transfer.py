@@ -0,0 +1,208 @@
+import asyncio
+import datetime
+import logging
+import os
+import time
+
+import aiohttp
+from livekit import api
+from livekit.protocol.sip import TransferSIPParticipantRequest
+
+logger = logging.getLogger("livekit.agents")
+
+# --- Transfer to a human agent ---
+#
+#   request --+-- reserve agent (receive-api + Redis claim) --+-- REFER / dial agent leg -- answered
+#             +-- hand-off line (TTS) -------------------------+
+#
+# The hand-off line plays while an agent is reserved and, in warm mode, while
+# the agent's leg rings. Nothing waits on a fixed sleep: the REFER call
+# returns when the SIP transfer completes, and the agent leg is done when its
+# sip.callStatus attribute turns "active".
+#
+# TRANSFER_MODE=refer  SIP REFER of the candidate to the agent's extension (cold)
+# TRANSFER_MODE=warm   dial the agent into this room, then the AI leaves (no re-INVITE of the candidate)
+#
+# On failure the agent leg is removed and the reservation released. Every
+# attempt, with per-phase timings, is pushed to `transfers` on the call document.
+TRANSFER_MODE = os.getenv("TRANSFER_MODE", "refer")
+VICI_SIP_HOST = os.getenv("VICI_SIP_HOST", "192.168.1.63")
+TRANSFER_TRUNK_ID = os.getenv("TRANSFER_TRUNK_ID", "ST_5oPz3JBMGjbM")
+TRANSFER_DID = os.getenv("TRANSFER_DID", "123456789")  # routed to the closer in-group
+ANSWER_TIMEOUT = float(os.getenv("TRANSFER_ANSWER_TIMEOUT", "30"))
+REFER_TIMEOUT = 20
+# An agent stays claimed this long after a transfer, until Vicidial shows them INCALL
+RESERVATION_TTL = 60
+RESERVATION_KEY = "transfer:agent:{}"
+CANDIDATE_AGENTS = 5
+HANDOFF_LINE = "One moment, I'm connecting you to a specialist now."
+
+# Delete the claim only if this room still holds it
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+return 0
+"""
+
+
+class TransferFailed(Exception):
+    def __init__(self, outcome, detail=""):
+        super().__init__(detail or outcome)
+        self.outcome = outcome
+
+
+def reserve_agent(rd, agents, room_name):
+    """First READY agent nobody else is transferring to."""
+    for agent in agents:
+        if agent.get("user") and rd.set(RESERVATION_KEY.format(agent["user"]), room_name, nx=True, ex=RESERVATION_TTL):
+            return agent
+    return None
+
+
+def release_agent(rd, user, room_name):
+    rd.eval(_RELEASE_SCRIPT, 1, RESERVATION_KEY.format(user), room_name)
+
+
+class TransferAttempt:
+    def __init__(self, room, session, lk_api, rd, participant, receive_api_url, mode=TRANSFER_MODE):
+        self.room = room
+        self.session = session
+        self.lk_api = lk_api
+        self.rd = rd
+        self.participant = participant
+        self.receive_api_url = receive_api_url
+        self.mode = mode
+        self.agent = None
+        self.leg_identity = None
+        self.answered = None
+        self.started = None
+        self.phases = {}
+
+    def _mark(self, phase, since):
+        self.phases[phase] = round((time.perf_counter() - since) * 1000)
+
+    async def run(self):
+        """Returns the attempt record; outcome is "transferred"/"bridged" or a failure reason."""
+        self.started = time.perf_counter()
+        attempt = {"mode": self.mode, "started_at": datetime.datetime.utcnow()}
+        announce = self.session.say(HANDOFF_LINE)
+        announce_started = time.perf_counter()
+        try:
+            await self._reserve()
+            if self.mode == "warm":
+                self._watch_leg()
+                await self._dial()
+                await self._wait_answered()
+                await self._finish_announce(announce, announce_started)
+                attempt["outcome"] = "bridged"
+            else:
+                await self._finish_announce(announce, announce_started)
+                await self._refer()
+                attempt["outcome"] = "transferred"
+            self._mark("total", self.started)
+            logger.info("Transfer to agent %s %s in %dms: %s", self.agent["user"], attempt["outcome"], self.phases["total"], self.phases)
+        except Exception as e:
+            attempt["outcome"] = e.outcome if isinstance(e, TransferFailed) else "failed"
+            attempt["error"] = str(e)
+            logger.warning("Transfer failed (%s): %s", attempt["outcome"], e)
+            if not announce.done():
+                announce.interrupt()
+            await self._rollback()
+            self._mark("total", self.started)
+        attempt["agent"] = self.agent["user"] if self.agent else None
+        attempt["phases_ms"] = self.phases
+        return attempt
+
+    # --- Phases ---
+    async def _reserve(self):
+        start = time.perf_counter()
+        async with aiohttp.ClientSession() as http:
+            async with http.post(f"{self.receive_api_url}/liveagents", params={"limit": CANDIDATE_AGENTS}, timeout=3) as resp:
+                resp.raise_for_status()
+                data = await resp.json()
+        self.agent = reserve_agent(self.rd, data.get("agents") or [data], self.room.name)
+        self._mark("reserve", start)
+        if self.agent is None:
+            raise TransferFailed("no_agent", "All agents busy")
+
+    async def _finish_announce(self, announce, started):
+        await announce
+        self._mark("announce", started)
+
+    async def _refer(self):
+        start = time.perf_counter()
+        request = TransferSIPParticipantRequest(
+            participant_identity=self.participant.identity,
+            room_name=self.room.name,
+            transfer_to=f"sip:{self.agent['user']}@{VICI_SIP_HOST}",
+            play_dialtone=True
+        )
+        # Returns once the far end has accepted the REFER
+        await asyncio.wait_for(self.lk_api.sip.transfer_sip_participant(request), REFER_TIMEOUT)
+        self._mark("refer", start)
+
+    def _watch_leg(self):
+        """Subscribe before dialing so a fast answer can't be missed."""
+        self.leg_identity = f"agent-{self.agent['user']}"
+        answered = self.answered = asyncio.get_running_loop().create_future()
+
+        def check(p):
+            if p.identity != self.leg_identity or answered.done():
+                return
+            status = p.attributes.get("sip.callStatus")
+            if status == "active":
+                answered.set_result(True)
+            elif status == "hangup":
+                answered.set_exception(TransferFailed("no_answer", f"Agent {self.agent['user']} hung up"))
+
+        def on_attributes(changed, p):
+            check(p)
+
+        def on_left(p):
+            if p.identity == self.leg_identity and not answered.done():
+                answered.set_exception(TransferFailed("no_answer", f"Agent {self.agent['user']} leg left"))
+
+        self.room.on("participant_attributes_changed", on_attributes)
+        self.room.on("participant_connected", check)
+        self.room.on("participant_disconnected", on_left)
+
+        def unsubscribe(_):
+            self.room.off("participant_attributes_changed", on_attributes)
+            self.room.off("participant_connected", check)
+            self.room.off("participant_disconnected", on_left)
+
+        answered.add_done_callback(unsubscribe)
+
+    async def _dial(self):
+        start = time.perf_counter()
+        await self.lk_api.sip.create_sip_participant(api.CreateSIPParticipantRequest(
+            sip_trunk_id=TRANSFER_TRUNK_ID,
+            sip_call_to=TRANSFER_DID,
+            room_name=self.room.name,
+            participant_identity=self.leg_identity,
+            headers={"X-VC-Payload": self.agent["user"]}  # Vicidial routes the leg to this agent
+        ))
+        self._mark("dial", start)
+
+    async def _wait_answered(self):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.answered, ANSWER_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise TransferFailed("no_answer", f"Agent {self.agent['user']} did not answer in {ANSWER_TIMEOUT:.0f}s")
+        self._mark("ring", start)
+
+    async def _rollback(self):
+        if self.answered and not self.answered.done():
+            self.answered.cancel()  # drops the room listeners
+        if self.leg_identity:
+            try:
+                await self.lk_api.room.remove_participant(
+                    api.RoomParticipantIdentity(room=self.room.name, identity=self.leg_identity))
+            except Exception as e:
+                # Never joined, or already gone
+                logger.debug("Agent leg removal: %s", e)
+        if self.agent:
+            try:
+                release_agent(self.rd, self.agent["user"], self.room.name)
+            except Exception as e:
+                logger.error("Reservation release failed for agent %s: %s", self.agent["user"], e)
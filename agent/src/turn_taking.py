@@ -0,0 +1,92 @@
+import logging
+import re
+
+logger = logging.getLogger("livekit.agents")
+
+# --- Step-aware turn-taking ---
+# Each step in kb.py names a turn profile ("yes_no", "short", "open"), loaded
+# into Redis as turn_profile:<name>. Before the candidate answers a step, the
+# agent switches the session's endpointing delays and Deepgram's endpointing
+# to that profile. For yes/no and short answers it also watches the
+# transcripts and commits the turn as soon as the answer is complete, without
+# waiting out the silence timer.
+DEFAULT_PROFILE = {"min_endpointing_delay": 0.5, "max_endpointing_delay": 6.0, "stt_endpointing_ms": 25, "early_commit": False}
+
+YES_NO_WORDS = {
+    "yes", "yeah", "yep", "yup", "sure", "okay", "ok", "fine", "no", "nope", "definitely", "absolutely",
+    "haan", "ha", "ji", "nahi", "nahin", "theek", "thik", "bilkul", "accha", "acha", "done", "correct",
+}
+FILLERS = {"um", "uh", "hmm", "ah", "oh", "well"}
+# The candidate is still going: "yes but...", "no because..."
+CONTINUATIONS = {"but", "and", "because", "so", "also", "if", "or", "the", "a", "to", "lekin", "par", "aur", "kyunki", "um", "uh", "like"}
+WORD_RE = re.compile(r"[a-zA-Z']+|[ऀ-ॿ]+")
+
+_profiles = {}  # profiles only change with a kb.py reload; read each once per process
+
+
+def get_profile(rd, step):
+    name = rd.hget(f"step:{step}", "turn")
+    if not name:
+        return DEFAULT_PROFILE
+    if name not in _profiles:
+        raw = rd.hgetall(f"turn_profile:{name}") or {}
+        _profiles[name] = {
+            "name": name,
+            "min_endpointing_delay": float(raw.get("min_endpointing_delay", DEFAULT_PROFILE["min_endpointing_delay"])),
+            "max_endpointing_delay": float(raw.get("max_endpointing_delay", DEFAULT_PROFILE["max_endpointing_delay"])),
+            "stt_endpointing_ms": int(raw.get("stt_endpointing_ms", DEFAULT_PROFILE["stt_endpointing_ms"])),
+            "early_commit": raw.get("early_commit") == "1",
+        }
+    return _profiles[name]
+
+
+def apply_profile(session, stt, profile):
+    # update_options, not session.options: the running activity copied the
+    # delays when it started and only picks up changes through this call
+    session.update_options(min_endpointing_delay=profile["min_endpointing_delay"],
+                           max_endpointing_delay=profile["max_endpointing_delay"])
+    if hasattr(stt, "update_options"):
+        stt.update_options(endpointing_ms=profile["stt_endpointing_ms"])
+
+
+def answer_complete(text, profile):
+    """Local end-of-utterance check on a (possibly interim) transcript."""
+    if not profile["early_commit"]:
+        return False
+    words = [w.lower() for w in WORD_RE.findall(text or "")]
+    if not words or words[-1] in CONTINUATIONS:
+        return False
+    if profile.get("name") == "yes_no":
+        # "yes", "haan ji", "no I can't" - a short reply that opens with a yes/no word
+        # ("I'm not..." or "so what..." is something else, wait for it)
+        words = [w for w in words if w not in FILLERS] or words
+        return len(words) <= 6 and words[0] in YES_NO_WORDS
+    # Short answers (languages, "sounds good"): a finished sentence of a few words
+    return len(words) <= 12 and text.rstrip().endswith((".", "!", "?"))
+
+
+class TurnTaker:
+    """Per-call: tracks the step being answered and commits complete answers early."""
+
+    def __init__(self, session, stt, rd):
+        self.session = session
+        self.stt = stt
+        self.rd = rd
+        self.profile = DEFAULT_PROFILE
+        self.committed = False
+        self.early_commits = 0
+
+    def expect_answer(self, step):
+        self.profile = get_profile(self.rd, step)
+        self.committed = False
+        apply_profile(self.session, self.stt, self.profile)
+
+    def on_transcript(self, transcript, is_final):
+        # Yes/no answers can be committed from an interim result; longer answers wait for the final
+        if self.committed or (not is_final and self.profile.get("name") != "yes_no"):
+            return
+        if answer_complete(transcript, self.profile) and hasattr(self.session, "commit_user_turn"):
+            self.committed = True
+            self.early_commits += 1
+            logger.debug("Early end of turn (%s): %r", self.profile.get("name"), transcript)
+            self.session.commit_user_turn()
@@ -0,0 +1,144 @@
+import asyncio
+import datetime
+import logging
+import os
+import random
+import re
+
+import aiohttp
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger("evaluator")
+
+# --- Vicidial hot-lead callbacks ---
+# One dispatcher per evaluator process:
+#   - a single pooled aiohttp session (keep-alive to the Vicidial web server)
+#   - CALLBACK_CONCURRENCY workers draining a queue, so an evaluation burst
+#     turns into a steady trickle of add_lead requests
+#   - dedupe per phone number for CALLBACK_DEDUPE_HOURS, claimed atomically in
+#     Mongo so re-evaluations, reconnections and other evaluator processes
+#     don't add the same lead to the hopper twice
+#   - network errors / 5xx retry with jittered backoff
+# Every attempt and its response is appended to callback_log on the call.
+# add_lead takes one lead per request, so there is nothing to batch beyond this.
+CALLBACK_CONCURRENCY = int(os.getenv("CALLBACK_CONCURRENCY", "4"))
+CALLBACK_DEDUPE_HOURS = float(os.getenv("CALLBACK_DEDUPE_HOURS", "24"))
+CALLBACK_MAX_ATTEMPTS = 4
+CALLBACK_TIMEOUT = 10
+CLAIMS_COLLECTION = "vicidial_callback_claims"
+
+
+def normalize_phone(phone):
+    digits = re.sub(r"\D", "", str(phone))
+    # 91XXXXXXXXXX / 0XXXXXXXXXX / XXXXXXXXXX are the same lead
+    return digits[-10:]
+
+
+class CallbackDispatcher:
+    def __init__(self, db, url, concurrency=CALLBACK_CONCURRENCY):
+        self.db = db
+        self.collection = db.conversation_history
+        self.url = url
+        self.concurrency = concurrency
+        self.queue = asyncio.Queue()
+        self.http = None
+        self.workers = []
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        self.http = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=CALLBACK_TIMEOUT))
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(self.concurrency)]
+        # Callbacks queued before a restart
+        async for doc in self.collection.find({"vicidial_callback.status": "queued"}, {"call_id": 1, "phone_no": 1, "name": 1}):
+            self.queue.put_nowait((doc.get("phone_no"), doc["call_id"], doc.get("name", "Candidate")))
+
+    async def close(self):
+        for w in self.workers:
+            w.cancel()
+        if self.http:
+            await self.http.close()
+
+    async def submit(self, phone, call_id, name):
+        """Queues the callback and returns; the outcome lands on the call document."""
+        await self.collection.update_one(
+            {"call_id": call_id},
+            {"$set": {"vicidial_callback": {"status": "queued", "queued_at": datetime.datetime.utcnow()}}}
+        )
+        self.queue.put_nowait((phone, call_id, name))
+
+    async def claim(self, phone, call_id):
+        """True if this call may send for this phone. Re-sending for the same call is allowed (restart recovery)."""
+        now = datetime.datetime.utcnow()
+        cutoff = now - datetime.timedelta(hours=CALLBACK_DEDUPE_HOURS)
+        try:
+            await self.db[CLAIMS_COLLECTION].update_one(
+                {"_id": phone, "$or": [{"claimed_at": {"$lt": cutoff}}, {"call_id": call_id}]},
+                {"$set": {"call_id": call_id, "claimed_at": now}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The phone already has a claim inside the window from another call
+            return False
+
+    async def release(self, phone, call_id):
+        await self.db[CLAIMS_COLLECTION].delete_one({"_id": phone, "call_id": call_id})
+
+    async def log(self, call_id, entry, status=None):
+        update = {"$push": {"callback_log": {**entry, "at": datetime.datetime.utcnow()}}}
+        if status:
+            update["$set"] = {"vicidial_callback.status": status}
+        await self.collection.update_one({"call_id": call_id}, update)
+
+    async def worker(self):
+        while True:
+            phone, call_id, name = await self.queue.get()
+            try:
+                await self.send(phone, call_id, name)
+            except Exception as e:
+                logger.error(f"Vicidial callback for {call_id} crashed: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def send(self, phone, call_id, name):
+        key = normalize_phone(phone)
+        if not key:
+            await self.log(call_id, {"error": f"unusable phone number {phone!r}"}, status="invalid_phone")
+            return
+        if not await self.claim(key, call_id):
+            logger.info(f"🔁 Skipping duplicate Vicidial callback for {key} ({call_id})")
+            await self.log(call_id, {"phone": key, "skipped": "duplicate"}, status="duplicate")
+            return
+
+        params = {
+            "phone_number": str(phone),
+            "first_name": str(name),
+            "comments": f"CallID: {call_id}"
+        }
+        for attempt in range(1, CALLBACK_MAX_ATTEMPTS + 1):
+            try:
+                async with self.http.get(self.url, params=params) as resp:
+                    text = (await resp.text()).strip()
+                    status_code = resp.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                text, status_code = repr(e), None
+
+            retryable = status_code is None or status_code >= 500
+            if not retryable and status_code == 200 and not text.startswith("ERROR"):
+                logger.info(f"☎️ Vicidial callback triggered: {text}")
+                await self.log(call_id, {"phone": key, "attempt": attempt, "http_status": status_code, "response": text}, status="sent")
+                return
+
+            await self.log(call_id, {"phone": key, "attempt": attempt, "http_status": status_code, "response": text})
+            if not retryable or attempt == CALLBACK_MAX_ATTEMPTS:
+                break
+            await asyncio.sleep(random.uniform(0, 2 ** attempt))
+
+        # Not added: free the phone so a later evaluation can try again
+        logger.error(f"❌ Vicidial callback failed for {call_id}: {text}")
+        await self.release(key, call_id)
+        await self.log(call_id, {"phone": key, "gave_up": True}, status="failed")
+
+
+async def ensure_indexes(db):
+    await db[CLAIMS_COLLECTION].create_index("claimed_at", expireAfterSeconds=int(CALLBACK_DEDUPE_HOURS * 3600 * 2))
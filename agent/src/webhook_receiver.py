@@ -0,0 +1,86 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import sys
+
+import aiohttp
+import redis.asyncio as aioredis
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Request
+from livekit import api
+
+from event_bus import EVENTS, REDIS_URL, publish
+
+load_dotenv()
+
+# LiveKit webhook receiver -> Redis stream (see event_bus.py)
+#
+# livekit.yaml:
+#   webhook:
+#     api_key: <LIVEKIT_API_KEY>
+#     urls:
+#       - http://192.168.1.61:9003/livekit/webhook
+#
+# Replay recorded webhooks locally (signed with the same key/secret):
+#   python webhook_receiver.py replay webhooks.jsonl [http://127.0.0.1:9003/livekit/webhook]
+
+logger = logging.getLogger("webhooks")
+
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "9003"))
+# Optional: append every verified raw body here, for the replayer
+RECORD_FILE = os.getenv("WEBHOOK_RECORD_FILE")
+
+app = FastAPI()
+receiver = api.WebhookReceiver(api.TokenVerifier(os.getenv("LIVEKIT_API_KEY"), os.getenv("LIVEKIT_API_SECRET")))
+redis_client = aioredis.from_url(REDIS_URL, decode_responses=True)
+
+
+@app.post("/livekit/webhook")
+async def livekit_webhook(request: Request):
+    body = (await request.body()).decode()
+    try:
+        event = receiver.receive(body, request.headers.get("Authorization", ""))
+    except Exception as e:
+        logger.warning(f"Rejected webhook: {e}")
+        raise HTTPException(status_code=401, detail="invalid signature")
+
+    if RECORD_FILE:
+        with open(RECORD_FILE, "a") as f:
+            f.write(body.replace("\n", "") + "\n")
+
+    if event.event in EVENTS:
+        await publish(redis_client, event)
+        logger.info(f"📨 {event.event} room={event.room.name or event.egress_info.room_name} id={event.id}")
+    return {"status": "ok"}
+
+
+# --- Local replayer ---
+def sign(body):
+    token = api.AccessToken(os.getenv("LIVEKIT_API_KEY"), os.getenv("LIVEKIT_API_SECRET"))
+    token = token.with_sha256(base64.b64encode(hashlib.sha256(body.encode()).digest()).decode())
+    return token.to_jwt()
+
+
+async def replay(path, url):
+    async with aiohttp.ClientSession() as session:
+        with open(path) as f:
+            for line in f:
+                body = line.strip()
+                if not body:
+                    continue
+                headers = {"Authorization": sign(body), "Content-Type": "application/webhook+json"}
+                async with session.post(url, data=body, headers=headers) as resp:
+                    print(f"{json.loads(body).get('event')}: {resp.status}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) >= 3 and sys.argv[1] == "replay":
+        url = sys.argv[3] if len(sys.argv) > 3 else f"http://127.0.0.1:{WEBHOOK_PORT}/livekit/webhook"
+        asyncio.run(replay(sys.argv[2], url))
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=WEBHOOK_PORT)
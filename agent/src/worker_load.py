@@ -0,0 +1,259 @@
+import asyncio
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import deque
+
+# --- Load Config ---
+# Ceiling comes from the calibration file when present, else this default
+DEFAULT_MAX_CALLS = int(os.getenv("MAX_CONCURRENT_CALLS", "20"))
+CAPACITY_FILE = os.getenv("WORKER_CAPACITY_FILE", os.path.join(os.path.dirname(__file__), "worker_capacity.json"))
+
+# THREAD executor: all jobs share one process (and one GIL), so CPU is measured
+# in cores used by this process, not host-wide percent.
+MAX_CPU_CORES = float(os.getenv("LOAD_MAX_CPU_CORES", "0.85"))
+MAX_RSS_MB = float(os.getenv("LOAD_MAX_RSS_MB", "3072"))
+MAX_LOOP_LAG_MS = float(os.getenv("LOAD_MAX_LOOP_LAG_MS", "50"))
+# A TTS first-byte slower than this counts as an unhealthy audio turn
+MAX_TTS_TTFB_S = float(os.getenv("LOAD_MAX_TTS_TTFB_S", "1.5"))
+
+LAG_PROBE_INTERVAL = 0.1
+# A session error marks the job degraded for this long, not for the rest of the call
+ERROR_WINDOW_S = float(os.getenv("LOAD_ERROR_WINDOW_S", "60"))
+# Degraded audio counts as node pressure from this many jobs up: one bad call
+# (one candidate's network) says nothing about the node, even if it's the only one
+MIN_DEGRADED_JOBS = int(os.getenv("LOAD_MIN_DEGRADED_JOBS", "3"))
+SMOOTHING = 0.3
+
+# Calibration: LOAD_CALIBRATE=1 lifts the job ceiling and records samples
+CALIBRATE = os.getenv("LOAD_CALIBRATE") == "1"
+CALIBRATION_SAMPLES = os.getenv("LOAD_CALIBRATION_SAMPLES", "load_samples.jsonl")
+CALIBRATION_MAX_CALLS = 100
+
+# Worker metrics endpoint (GET /metrics); on by default when LOOP_DEBUG=1
+METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "8082" if os.getenv("LOOP_DEBUG") == "1" else "0"))
+
+
+def read_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Peak RSS, kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_capacity():
+    try:
+        with open(CAPACITY_FILE) as f:
+            return int(json.load(f)["max_calls"])
+    except (OSError, ValueError, KeyError):
+        return DEFAULT_MAX_CALLS
+
+
+class JobHealth:
+    """
+    Written from the job's thread, read from the load_fnc thread: every access
+    goes through self.lock so sampling never iterates a deque being appended to.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lag_ms = deque(maxlen=50)
+        self.tts_ttfb = deque(maxlen=20)
+        self.error_times = deque(maxlen=20)
+        self.task = None
+
+    def add_lag(self, ms):
+        with self.lock:
+            self.lag_ms.append(ms)
+
+    def add_ttfb(self, ttfb):
+        with self.lock:
+            self.tts_ttfb.append(ttfb)
+
+    def add_error(self):
+        with self.lock:
+            self.error_times.append(time.monotonic())
+
+    def snapshot(self):
+        """(lag samples, degraded) from copies taken under the lock."""
+        with self.lock:
+            lags, ttfbs, errors = list(self.lag_ms), list(self.tts_ttfb), list(self.error_times)
+        recent_error = bool(errors) and time.monotonic() - errors[-1] < ERROR_WINDOW_S
+        slow = sum(1 for t in ttfbs if t > MAX_TTS_TTFB_S)
+        degraded = (
+            (bool(lags) and max(lags) > MAX_LOOP_LAG_MS * 2)
+            or recent_error
+            or (len(ttfbs) >= 3 and slow / len(ttfbs) > 0.5)
+        )
+        return lags, degraded
+
+
+class LoadMonitor:
+    """Samples CPU, RSS, event-loop lag and per-job audio health for compute_load."""
+
+    def __init__(self):
+        self.max_calls = CALIBRATION_MAX_CALLS if CALIBRATE else load_capacity()
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.last_wall = time.monotonic()
+        self.last_cpu = time.process_time()
+        self.pressure = 0.0
+        self.last_sample = {}
+
+    # --- Per-job probes (run inside each job's event loop) ---
+    def watch_job(self, job_id, session=None):
+        health = JobHealth()
+        with self.lock:
+            self.jobs[job_id] = health
+
+        if session is not None:
+            @session.on("metrics_collected")
+            def _on_metrics(ev):
+                ttfb = getattr(ev.metrics, "ttfb", None)
+                if type(ev.metrics).__name__ == "TTSMetrics" and ttfb is not None and ttfb >= 0:
+                    health.add_ttfb(ttfb)
+
+            @session.on("error")
+            def _on_error(ev):
+                health.add_error()
+
+        health.task = asyncio.create_task(self._probe_lag(health))
+        return health
+
+    def unwatch_job(self, job_id):
+        with self.lock:
+            health = self.jobs.pop(job_id, None)
+        if health and health.task:
+            health.task.cancel()
+
+    async def _probe_lag(self, health):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            health.add_lag(max((loop.time() - start - LAG_PROBE_INTERVAL) * 1000, 0.0))
+
+    # --- Worker-level sampling ---
+    def sample(self, active_jobs):
+        now, cpu = time.monotonic(), time.process_time()
+        wall = now - self.last_wall
+        cpu_cores = (cpu - self.last_cpu) / wall if wall > 0 else 0.0
+        self.last_wall, self.last_cpu = now, cpu
+
+        with self.lock:
+            jobs = list(self.jobs.values())
+        snapshots = [h.snapshot() for h in jobs]
+        lags = sorted(l for job_lags, _ in snapshots for l in job_lags)
+        lag_p95 = lags[int(len(lags) * 0.95)] if lags else 0.0
+
+        self.last_sample = {
+            "ts": time.time(),
+            "active_jobs": active_jobs,
+            "cpu_cores": round(cpu_cores, 3),
+            "rss_mb": round(read_rss_mb(), 1),
+            "loop_lag_p95_ms": round(lag_p95, 2),
+            "degraded_jobs": sum(1 for _, degraded in snapshots if degraded),
+        }
+        return self.last_sample
+
+    def compute_load(self, active_jobs):
+        s = self.sample(active_jobs)
+
+        # Resource pressure is smoothed so one slow sample doesn't drain the node,
+        # the job count is not so bursts can't overpack it.
+        pressure = max(
+            s["cpu_cores"] / MAX_CPU_CORES,
+            s["rss_mb"] / MAX_RSS_MB,
+            s["loop_lag_p95_ms"] / MAX_LOOP_LAG_MS,
+            s["degraded_jobs"] / max(active_jobs, 1) if s["degraded_jobs"] >= MIN_DEGRADED_JOBS else 0.0,
+        )
+        self.pressure = SMOOTHING * pressure + (1 - SMOOTHING) * self.pressure
+        load = min(max(active_jobs / self.max_calls, self.pressure), 1.0)
+
+        if CALIBRATE:
+            with open(CALIBRATION_SAMPLES, "a") as f:
+                f.write(json.dumps({**s, "load": round(load, 3)}) + "\n")
+        return load
+
+
+load_monitor = LoadMonitor()
+
+
+# --- Metrics endpoint ---
+# Runs on its own thread and loop, so it still answers while a job loop is blocked
+def start_metrics_server(port=METRICS_PORT):
+    from aiohttp import web
+    from log_setup import dropped_records
+    from loop_watchdog import watchdog
+    from speculation import report as speculation_report
+
+    async def metrics(request):
+        return web.json_response({
+            "load": load_monitor.last_sample,
+            "pressure": round(load_monitor.pressure, 3),
+            "max_calls": load_monitor.max_calls,
+            "event_loop": watchdog.report(),
+            "log_records_dropped": dropped_records(),
+            "speculative_reply": speculation_report(),
+        })
+
+    def serve():
+        app = web.Application()
+        app.router.add_get("/metrics", metrics)
+        loop = asyncio.new_event_loop()
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, "0.0.0.0", port).start())
+        loop.run_forever()
+
+    threading.Thread(target=serve, name="worker-metrics", daemon=True).start()
+
+
+# --- Calibration ---
+# 1. Run the worker with LOAD_CALIBRATE=1 and ramp calls up (real or load-test traffic)
+# 2. python worker_load.py calibrate [load_samples.jsonl]
+# Writes the highest concurrency whose samples stayed inside every limit.
+def calibrate(samples_path):
+    by_jobs = {}
+    with open(samples_path) as f:
+        for line in f:
+            s = json.loads(line)
+            by_jobs.setdefault(s["active_jobs"], []).append(s)
+
+    safe = 0
+    for jobs in sorted(by_jobs):
+        if jobs == 0:
+            continue
+        samples = by_jobs[jobs]
+        lags = sorted(s["loop_lag_p95_ms"] for s in samples)
+        lag_p95 = lags[int(len(lags) * 0.95)]
+        cpu = max(s["cpu_cores"] for s in samples)
+        rss = max(s["rss_mb"] for s in samples)
+        ok = (
+            lag_p95 <= MAX_LOOP_LAG_MS and cpu <= MAX_CPU_CORES and rss <= MAX_RSS_MB
+            and not any(s["degraded_jobs"] for s in samples)
+        )
+        print(f"{jobs:>4} calls: lag_p95={lag_p95:.1f}ms cpu={cpu:.2f} rss={rss:.0f}MB {'ok' if ok else 'OVER'}")
+        if not ok:
+            break
+        safe = jobs
+
+    if not safe:
+        print("No safe concurrency level found, keeping the current capacity file.")
+        return
+    with open(CAPACITY_FILE, "w") as f:
+        json.dump({"max_calls": safe, "calibrated_at": time.time(), "samples": samples_path}, f)
+    print(f"✅ Safe ceiling for this host: {safe} concurrent calls (written to {CAPACITY_FILE})")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "calibrate":
+        calibrate(sys.argv[2] if len(sys.argv) > 2 else CALIBRATION_SAMPLES)
+    else:
+        print("Usage: python worker_load.py calibrate [load_samples.jsonl]")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+import os
+import queue
+import re
+import sys
+
+import pymysql
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agent", "src"))
+from call_context import sign_payload
+
+# Long-running FastAGI replacement for greet-agi-load.php.
+#
+# extensions.conf:
+#   same => n,AGI(agi://127.0.0.1:4573/greet,${VENDOR_LEAD_CODE})
+#
+# Sets the same AI_UNIQUEID / AI_NAME / AI_PAYLOAD variables as the PHP script,
+# but with a pooled DB connection, one joined lead query, and the call context
+# written straight into ai_call_data (no curl to receive-api).
+
+logger = logging.getLogger("fastagi")
+
+AGI_HOST = os.getenv("FASTAGI_HOST", "127.0.0.1")
+AGI_PORT = int(os.getenv("FASTAGI_PORT", "4573"))
+ASTGUICLIENT_CONF = os.getenv("ASTGUICLIENT_CONF", "/etc/astguiclient.conf")
+DB_POOL_SIZE = int(os.getenv("FASTAGI_DB_POOL", "4"))
+
+LEAD_QUERY = """
+    SELECT l.lead_id, l.first_name, l.phone_number
+    FROM vicidial_auto_calls ac
+    JOIN vicidial_list l ON l.lead_id = ac.lead_id
+    WHERE ac.callerid = %s
+    LIMIT 1
+"""
+CONTEXT_UPSERT = """
+    INSERT INTO ai_call_data (unique_id, first_name, field_2, field_3)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        first_name = VALUES(first_name),
+        field_2 = VALUES(field_2),
+        field_3 = VALUES(field_3)
+"""
+
+
+def load_db_config(path=ASTGUICLIENT_CONF):
+    """Parsed once at startup (the PHP script re-read it on every call)."""
+    with open(path) as f:
+        conf = f.read()
+
+    def value(key):
+        m = re.search(rf"{key}\s*=>\s*(.*)", conf)
+        return m.group(1).strip() if m else ""
+
+    return {"host": value("VARDB_server"), "user": value("VARDB_user"),
+            "password": value("VARDB_pass"), "db": value("VARDB_database"),
+            "port": int(value("VARDB_port") or 3306)}
+
+
+class DBPool:
+    """Small pool of persistent pymysql connections; queries run in worker threads."""
+
+    def __init__(self, config, size):
+        self.config = config
+        self.conns = queue.Queue()
+        for _ in range(size):
+            self.conns.put(self._connect())
+
+    def _connect(self):
+        return pymysql.connect(**self.config, cursorclass=pymysql.cursors.DictCursor, autocommit=True)
+
+    def _run(self, sql, args, fetch):
+        conn = self.conns.get()
+        try:
+            conn.ping(reconnect=True)
+            with conn.cursor() as cursor:
+                cursor.execute(sql, args)
+                return cursor.fetchone() if fetch else None
+        finally:
+            self.conns.put(conn)
+
+    async def fetchone(self, sql, args):
+        return await asyncio.to_thread(self._run, sql, args, True)
+
+    async def execute(self, sql, args):
+        return await asyncio.to_thread(self._run, sql, args, False)
+
+
+class FastAGIServer:
+    def __init__(self, pool):
+        self.pool = pool
+        self.background = set()
+
+    async def read_env(self, reader):
+        env = {}
+        while True:
+            line = (await reader.readline()).decode().strip()
+            if not line:
+                return env
+            key, _, value = line.partition(":")
+            env[key.strip()] = value.strip()
+
+    async def agi_exec(self, reader, writer, cmd):
+        writer.write(f"{cmd}\n".encode())
+        await writer.drain()
+        return (await reader.readline()).decode().strip()
+
+    async def store_context(self, unique_id, first_name, lead_id, phone):
+        try:
+            await self.pool.execute(CONTEXT_UPSERT, (unique_id, first_name, f"lead_{lead_id}", phone))
+        except Exception as e:
+            logger.error(f"Context write failed for {unique_id}: {e}")
+
+    async def handle(self, reader, writer):
+        try:
+            env = await self.read_env(reader)
+            unique_id = env.get("agi_arg_1", "")
+
+            first_name, lead_id, phone = "Guest", "", ""
+            if unique_id:
+                row = await self.pool.fetchone(LEAD_QUERY, (unique_id,))
+                if row:
+                    first_name = (row["first_name"] or "Guest").strip()
+                    lead_id = str(row["lead_id"])
+                    phone = (row["phone_number"] or "").strip()
+
+            ai_payload = sign_payload({"fn": first_name, "ph": phone, "lead_id": lead_id, "unique_id": unique_id})
+
+            # Answer Asterisk first; the context store write doesn't hold up the call
+            await self.agi_exec(reader, writer, f'SET VARIABLE AI_UNIQUEID "{unique_id}"')
+            await self.agi_exec(reader, writer, f'SET VARIABLE AI_NAME "{first_name}"')
+            await self.agi_exec(reader, writer, f'SET VARIABLE AI_PAYLOAD "{ai_payload}"')
+            await self.agi_exec(reader, writer, f'VERBOSE "FastAGI: Pushed data for {unique_id} with name {first_name}" 1')
+
+            if unique_id:
+                task = asyncio.create_task(self.store_context(unique_id, first_name, lead_id, phone))
+                self.background.add(task)
+                task.add_done_callback(self.background.discard)
+        except Exception as e:
+            logger.error(f"AGI request failed: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, AGI_HOST, AGI_PORT)
+        logger.info(f"🚀 FastAGI server listening on {AGI_HOST}:{AGI_PORT}")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    pool = DBPool(load_db_config(), DB_POOL_SIZE)
+    asyncio.run(FastAGIServer(pool).serve())
@@ -25,6 +25,7 @@ $link = mysqli_connect($server, $user, $pass, $db);
 
 // 4. Fetch Data    
 $first_name = "Guest";
+$phone_number = "";
 $lead_id = "";
 
 if (!empty($unique_id)) {
@@ -35,24 +36,34 @@ if (!empty($unique_id)) {
         $lead_id = trim($row1['lead_id']);
     }
 
-    $query = "SELECT first_name FROM vicidial_list WHERE lead_id = '" . mysqli_real_escape_string($link, $lead_id) . "' LIMIT 1";
+    $query = "SELECT first_name, phone_number FROM vicidial_list WHERE lead_id = '" . mysqli_real_escape_string($link, $lead_id) . "' LIMIT 1";
     $result = mysqli_query($link, $query);
     if ($result && mysqli_num_rows($result) > 0) {
         $row = mysqli_fetch_assoc($result);
         $first_name = trim($row['first_name']);
+        $phone_number = trim($row['phone_number']);
     }
 }
 
-// 5. Create AI Payload (Base64-encoded JSON)
+// 5. Create AI Payload, signed so the agent can trust it without a lookup
+//    v1.<base64url(json)>.<base64url(hmac_sha256)>  (see agent/src/call_context.py)
+function b64url($data) {
+    return rtrim(strtr(base64_encode($data), '+/', '-_'), '=');
+}
+$payload_secret = getenv('AI_PAYLOAD_SECRET') ?: trim(@file_get_contents('/etc/greet/ai_payload.secret'));
 $payload_data = [
     "fn" => $first_name,
+    "ph" => $phone_number,
     "lead_id" => $lead_id,
-    "unique_id" => $unique_id
+    "unique_id" => $unique_id,
+    "v" => 1,
+    "ts" => time()
 ];
-$payload_json = json_encode($payload_data);
-$ai_payload = base64_encode($payload_json);
+$signed = "v1." . b64url(json_encode($payload_data));
+$ai_payload = $signed . "." . b64url(hash_hmac('sha256', $signed, $payload_secret, true));
 
 // 6. Push to FastAPI (Change IP to your LiveKit Server)
+//    Only used by the agent as a fallback when the signed payload is missing
 $api_url = 'http://192.168.1.61:9001/receive-data'; 
 $post_data = [
     "unique_id" => (string)$unique_id,